@@ -0,0 +1,51 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+"""
+Shows that parsing time grows linearly with the number of words in a line.
+
+The line is made of interspersed single-character words and options, which
+is the worst case for the parsing state since every word gets shuffled
+between the left and right argument queues.  If parsing is linear, the time
+per token stays flat as the line gets longer.
+
+Run with ``PYTHONPATH=. python benchmarks/parsing_state.py`` from a checkout.
+"""
+
+import timeit
+
+from irclick._parser import OptionParser
+from irclick._splut import Splut
+
+
+def make_parser():
+    parser = OptionParser()
+    parser.add_option(['-1', '--one'], dest='one', obj='one')
+    parser.add_option(['-2'], dest='two', obj='two', action='store_const',
+                      const=True)
+    parser.add_argument(dest='rest', obj='rest', nargs=-1)
+    return parser
+
+
+def make_line(n_tokens):
+    words = []
+    for i in range(n_tokens):
+        words.append(u'-2' if i % 4 == 0 else u'x')
+    return u' '.join(words)
+
+
+def main():
+    parser = make_parser()
+    print('%8s %12s %14s' % ('tokens', 'usec/parse', 'nsec/token'))
+    for n_tokens in [16, 64, 256, 1024, 4096]:
+        line = make_line(n_tokens)
+        timer = timeit.Timer(
+            lambda: parser.parse_args(Splut.args_of_line(line)))
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=5, number=number)) / number
+        print('%8d %12.1f %14.1f' % (
+            n_tokens, best * 1e6, best * 1e9 / n_tokens))
+
+
+if __name__ == '__main__':
+    main()
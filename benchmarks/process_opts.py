@@ -0,0 +1,82 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+"""
+Compares classifying options by looking them up against the old way of
+trying every option as a long option first and falling back to short
+options when that raised :class:`NoSuchOption`.
+
+The lines are the ones from ``test_flag_miscellany`` plus a lone short flag,
+which is most of what real traffic looks like.
+
+Run with ``PYTHONPATH=. python benchmarks/process_opts.py`` from a checkout.
+"""
+
+import timeit
+
+from click.exceptions import NoSuchOption
+from click.parser import normalize_opt
+
+from irclick._parser import OptionParser
+from irclick._splut import Splut
+
+
+class TryLongFirstParser(OptionParser):
+    """Classifies options the way OptionParser used to."""
+
+    def _process_opts(self, splut, state):
+        arg = splut.string
+        explicit_value = None
+        if '=' in arg:
+            long_opt, explicit_value = arg.split('=', 1)
+        else:
+            long_opt = arg
+        norm_long_opt = normalize_opt(long_opt, self.ctx)
+        try:
+            option, possibilities = self._options.long_option(norm_long_opt)
+            if option is None:
+                raise NoSuchOption(norm_long_opt, possibilities=possibilities)
+            self._match_long_opt(norm_long_opt, option, explicit_value, state)
+        except NoSuchOption:
+            if arg[:2] not in self._opt_prefixes:
+                return self._match_short_opt(splut, state)
+            raise
+
+
+LINES = [u'-v', u'-21hey', u'-12hey', u'--one=--two', u'-1=-2', u'-21=-2']
+
+
+def make_parser(cls):
+    parser = cls()
+    parser.add_option(['-1', '--one'], dest='one', obj='one')
+    parser.add_option(['-2', '--two'], dest='two', obj='two',
+                      action='store_const', const=True)
+    parser.add_option(['--no-two'], dest='two', obj='two',
+                      action='store_const', const=False)
+    parser.add_option(['-v'], dest='verbose', obj='verbose',
+                      action='count')
+    return parser
+
+
+def time_parse(parser, line):
+    timer = timeit.Timer(
+        lambda: parser.parse_args(Splut.args_of_line(line)))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+
+def main():
+    old = make_parser(TryLongFirstParser)
+    new = make_parser(OptionParser)
+    print('%-14s %12s %12s %8s' % ('line', 'old usec', 'new usec', 'speedup'))
+    for line in LINES:
+        assert old.parse_args(Splut.args_of_line(line))[0] == \
+            new.parse_args(Splut.args_of_line(line))[0]
+        old_time = time_parse(old, line)
+        new_time = time_parse(new, line)
+        print('%-14s %12.2f %12.2f %7.2fx' % (
+            line, old_time * 1e6, new_time * 1e6, old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
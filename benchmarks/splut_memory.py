@@ -0,0 +1,74 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+"""
+Compares the memory used by the words of a line with the original Splut,
+which had a ``__dict__`` and kept its regex match object alive, against the
+current slotted, offset-only Splut.
+
+Reports the bytes retained per word while a whole line is held, and how
+many words per second each can split out of a line.
+
+Run with ``PYTHONPATH=. python benchmarks/splut_memory.py`` from a checkout.
+"""
+
+import re
+import timeit
+import tracemalloc
+
+from irclick._splut import Splut
+
+
+class DictSplut(object):
+    """The Splut as it was before it became slotted and offset-based."""
+
+    def __init__(self, string, match, line):
+        self.string = string
+        self._match = match
+        self._line = line
+
+    @classmethod
+    def args_of_line(cls, line):
+        return [cls(m.group(0), m, line)
+                for m in re.finditer(u'(?u)\\S+', line)]
+
+
+def split_dict(line):
+    return DictSplut.args_of_line(line)
+
+
+def split_slotted(line):
+    return list(Splut.args_of_line(line))
+
+
+def retained_per_word(split, line):
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        words = split(line)
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (after - before) / len(words)
+
+
+def words_per_second(split, line):
+    n_words = len(split(line))
+    timer = timeit.Timer(lambda: split(line))
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=5, number=number)) / number
+    return n_words / best
+
+
+def main():
+    # About the most words that fit in one 512-byte IRC line.
+    line = u' '.join([u'ab'] * 170)
+    print('%-10s %16s %16s' % ('splut', 'bytes/word', 'words/sec'))
+    for name, split in [('dict', split_dict), ('slotted', split_slotted)]:
+        print('%-10s %16.1f %16.0f' % (
+            name, retained_per_word(split, line),
+            words_per_second(split, line)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+"""
+The benchmark suite for irclick's parsing pipeline.
+
+Each corpus is a few thousand generated lines shaped like real IRC traffic.
+Every corpus is run through three stages separately:
+
+``tokenize``
+    splitting every word out of each line with :meth:`Splut.args_of_line`.
+``parse``
+    the command's parsers only, through ``parse_line``.
+``invoke``
+    the whole of ``invoke_line``, with callbacks that do nothing.
+
+For each corpus and stage this reports per-line latency percentiles and
+throughput, and compares the median latency against a stored baseline.
+
+Run with ``PYTHONPATH=. python benchmarks/suite.py`` from a checkout.  Pass
+``--save`` to store the results as the new baseline, or ``--check`` to exit
+with an error if anything is slower than the baseline by more than the
+allowed ``--tolerance``.  Baselines are only comparable on the machine they
+were recorded on.
+"""
+
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+import click
+
+from irclick import line_command, trailer_argument
+from irclick._splut import Splut
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+STAGES = ['tokenize', 'parse', 'invoke']
+# IRC lines are at most 512 bytes including the command and the CRLF; this
+# is about what's left for a command's arguments in a PRIVMSG.
+MAX_ARGS_LENGTH = 440
+
+
+def make_word(rng, max_length=8):
+    return u''.join(rng.choice(string.ascii_lowercase)
+                    for _ in range(rng.randint(1, max_length)))
+
+
+def make_sentence(rng, length):
+    words = []
+    while sum(len(w) + 1 for w in words) < length:
+        words.append(make_word(rng))
+    return u' '.join(words)[:length].rstrip()
+
+
+def make_search_command():
+    @line_command()
+    @click.command()
+    @click.option('-n', '--count', type=int)
+    @click.option('-c', '--channel')
+    @click.option('-r', '--regex', is_flag=True)
+    @click.option('-i', '--ignore-case', is_flag=True)
+    @click.option('-v', '--verbose', count=True)
+    @trailer_argument('query')
+    def search(count, channel, regex, ignore_case, verbose, query):
+        pass
+    return search
+
+
+def make_deep_group(depth=4, width=8):
+    @line_command()
+    @click.group()
+    @click.option('-q', '--quiet', is_flag=True)
+    def root(quiet):
+        pass
+
+    def populate(group, level):
+        for i in range(width):
+            name = 'sub%d' % (i,)
+            if level == depth:
+                @group.command(name)
+                @click.option('-n', '--count', type=int)
+                @trailer_argument('trailer')
+                def leaf(count, trailer):
+                    pass
+            else:
+                populate(group.group(name)(lambda: None), level + 1)
+
+    populate(root, 1)
+    return root
+
+
+def short_lines(rng, n):
+    return [make_sentence(rng, rng.randint(1, 24)) for _ in range(n)]
+
+
+def max_length_lines(rng, n):
+    return [make_sentence(rng, MAX_ARGS_LENGTH) for _ in range(n)]
+
+
+def option_heavy_lines(rng, n):
+    flags = [u'-r', u'-i', u'-v', u'-vv', u'-riv', u'--regex',
+             u'--ignore-case', u'-n5', u'-n 10', u'--count=3',
+             u'-c #chan', u'--channel=#other']
+    lines = []
+    for _ in range(n):
+        opts = [rng.choice(flags) for _ in range(rng.randint(3, 10))]
+        lines.append(u' '.join(opts + [make_sentence(rng, 20)]))
+    return lines
+
+
+def trailer_lines(rng, n):
+    return [u'-n 3 ' + make_sentence(rng, rng.randint(100, MAX_ARGS_LENGTH))
+            for _ in range(n)]
+
+
+def deep_group_lines(rng, n, depth=4, width=8):
+    lines = []
+    for _ in range(n):
+        path = [u'sub%d' % (rng.randrange(width),) for _ in range(depth)]
+        lines.append(u'-q ' + u' '.join(path) + u' -n 2 ' +
+                     make_sentence(rng, 40))
+    return lines
+
+
+CORPORA = [
+    ('short', short_lines, make_search_command),
+    ('max-length', max_length_lines, make_search_command),
+    ('option-heavy', option_heavy_lines, make_search_command),
+    ('trailer', trailer_lines, make_search_command),
+    ('deep-groups', deep_group_lines, make_deep_group),
+]
+
+
+def tokenize(line):
+    for splut in Splut.args_of_line(line):
+        splut.string
+
+
+def measure(fn, lines, rounds):
+    for line in lines:
+        fn(line)
+    timings = []
+    clock = getattr(time, 'perf_counter', time.time)
+    start = clock()
+    for _ in range(rounds):
+        for line in lines:
+            before = clock()
+            fn(line)
+            timings.append(clock() - before)
+    total = clock() - start
+    timings.sort()
+
+    def percentile(p):
+        return timings[min(len(timings) - 1, int(len(timings) * p))] * 1e6
+
+    return {
+        'p50': percentile(0.5),
+        'p90': percentile(0.9),
+        'p99': percentile(0.99),
+        'lines_per_sec': len(timings) / total,
+    }
+
+
+def run(n_lines, rounds, seed):
+    results = {}
+    for name, make_lines, make_command in CORPORA:
+        rng = random.Random(seed)
+        lines = make_lines(rng, n_lines)
+        cmd = make_command()
+        stages = {
+            'tokenize': tokenize,
+            'parse': cmd.parse_line,
+            'invoke': cmd.invoke_line,
+        }
+        for stage in STAGES:
+            results['%s/%s' % (name, stage)] = measure(
+                stages[stage], lines, rounds)
+    return results
+
+
+def report(results, baseline, tolerance):
+    regressions = []
+    print('%-24s %9s %9s %9s %12s %9s' % (
+        'benchmark', 'p50 us', 'p90 us', 'p99 us', 'lines/sec', 'vs base'))
+    for key in sorted(results):
+        result = results[key]
+        compared = ''
+        if key in baseline:
+            ratio = result['p50'] / baseline[key]['p50']
+            compared = '%8.2fx' % (ratio,)
+            if ratio > 1 + tolerance:
+                regressions.append(key)
+                compared += ' !'
+        print('%-24s %9.2f %9.2f %9.2f %12.0f %s' % (
+            key, result['p50'], result['p90'], result['p99'],
+            result['lines_per_sec'], compared))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--lines', type=int, default=2000,
+                        help='lines per corpus')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='times to run each corpus')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown of the median before --check '
+                             'fails, as a fraction')
+    parser.add_argument('--save', action='store_true',
+                        help='store these results as the baseline')
+    parser.add_argument('--check', action='store_true',
+                        help='exit with an error on any regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.lines, args.rounds, args.seed)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as infile:
+            baseline = json.load(infile)
+    regressions = report(results, baseline, args.tolerance)
+
+    if args.save:
+        with open(args.baseline, 'w') as outfile:
+            json.dump(results, outfile, indent=2, sort_keys=True)
+            outfile.write('\n')
+    if args.check and regressions:
+        print('regressed: %s' % (', '.join(regressions),))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,38 @@
 # Copyright (c) Aaron Gallagher <_@habnab.it>
 # See LICENSE for details.
 
-from ._irclick import line_command, trailer_argument
-from ._version import get_versions
+import sys
 
-__version__ = get_versions()['version']
-del get_versions
+from ._batch import TokenizedBlock, tokenize_block
+from ._executor import OrderedExecutor
+from ._irclick import (
+    LineResult, ParsedLine, line_command, trailer_argument)
+from ._message import Message
+from ._router import Router
+from ._stream import LineBuffer, read_socket, replay_file
+
+
+def __getattr__(name):
+    # Working out the version can mean running git in a source checkout, so
+    # it's not done until someone actually asks for it.
+    if name == '__version__':
+        from ._version import get_versions
+        global __version__
+        __version__ = get_versions()['version']
+        return __version__
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+if sys.version_info < (3, 7):
+    __getattr__('__version__')
 
 
 __all__ = (
-    'line_command', 'trailer_argument', '__version__',
+    'LineBuffer', 'LineResult', 'Message', 'OrderedExecutor', 'ParsedLine',
+    'Router', 'TokenizedBlock', 'line_command', 'read_socket',
+    'replay_file', 'tokenize_block', 'trailer_argument', '__version__',
 )
+
+if sys.version_info >= (3, 5):
+    from ._aio import read_stream
+    __all__ += ('read_stream',)
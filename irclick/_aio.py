@@ -0,0 +1,94 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+import inspect
+
+from irclick._irclick import (
+    Invoke, ParseRecord, Return, clock, invoke_steps, make_context)
+from irclick._stream import MAX_LINE, LineBuffer
+
+
+async def ainvoke_line(cmd, cache, line, pos=0, endpos=None, **kw):
+    """Like :func:`invoke_line`, but awaits the result of any callback that
+    returns an awaitable.  Parsing still happens synchronously, before the
+    first await.
+
+    Each context stays open until its command's callback, and those of any
+    subcommands, have finished; so close callbacks run after the awaited
+    work instead of as soon as the coroutine is created.  Note that click
+    only makes the context current while the callback is called, not while
+    it's awaited, so a coroutine callback which needs its context should
+    use :func:`click.pass_context` rather than
+    :func:`click.get_current_context`.
+
+    Commands whose classes override :meth:`make_context`,
+    :meth:`parse_args` or a multi command's :meth:`invoke` can't be
+    invoked this way, and raise :exc:`TypeError`.
+    """
+    args = cache.args_of_line(line, pos, endpos)
+    record = ParseRecord.for_line(cache, line, pos, endpos, kw)
+    with make_context(cache, cmd, 'bogus', args, record=record,
+                      asynchronous=True, **kw) as ctx:
+        result = await ainvoke(cache, cmd, ctx)
+    if record is not None:
+        record.save(cache)
+    return result
+
+
+async def _call(cache, cmd, fn, *args):
+    """Calls ``fn(*args)`` and awaits the result if it's awaitable, reporting
+    the whole time taken as the callback stage of `cmd`.
+    """
+    hook = cache.timing_hook
+    start = clock() if hook is not None else None
+    try:
+        value = fn(*args)
+        if inspect.isawaitable(value):
+            value = await value
+        return value
+    finally:
+        if hook is not None:
+            hook('callback', cmd, clock() - start)
+
+
+async def ainvoke(cache, cmd, ctx):
+    """The asynchronous equivalent of :func:`invoke`, which awaits the
+    callbacks :func:`invoke_steps` calls for.
+    """
+    steps = invoke_steps(cache, cmd, ctx)
+    step = next(steps)
+    while not isinstance(step, Return):
+        try:
+            if isinstance(step, Invoke):
+                value = await ainvoke(cache, step.cmd, step.ctx)
+            else:
+                value = await _call(cache, step.cmd, step.fn, *step.args)
+        except BaseException as e:
+            step = steps.throw(e)
+        else:
+            step = steps.send(value)
+    return step.value
+
+
+async def read_stream(reader, dispatch, size=MAX_LINE):
+    """Like :func:`read_socket`, but reads from the
+    :class:`asyncio.StreamReader` `reader`, and awaits the result of
+    `dispatch` if it returns an awaitable, so a line command's
+    ``ainvoke_line`` works as `dispatch` too.
+
+    Each chunk read from `reader` is copied into the buffer once.  Nothing
+    more is read until the lines of the last chunk have been dispatched, so
+    `reader` pauses its transport once its own limit is reached.
+    """
+    lines = LineBuffer(size)
+    while True:
+        free = lines.free()
+        data = await reader.read(len(free))
+        free[:len(data)] = data
+        lines.commit(len(data))
+        for pos, endpos in lines.lines(eof=not data):
+            result = dispatch(lines.buffer, pos, endpos)
+            if inspect.isawaitable(result):
+                await result
+        if not data:
+            return
@@ -0,0 +1,175 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+import asyncio
+
+import click
+import pytest
+
+from irclick import line_command, read_stream, trailer_argument
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_ainvoke_line_awaits_callback():
+    events = []
+
+    @line_command()
+    @click.command()
+    @click.option('-1', '--one')
+    @trailer_argument('trailer')
+    @click.pass_context
+    async def cmd1(ctx, one, trailer):
+        ctx.call_on_close(lambda: events.append('closed'))
+        await asyncio.sleep(0)
+        events.append('callback')
+        return one, trailer
+
+    assert run(cmd1.ainvoke_line(u'-1hey hi hello')) == (u'hey', u'hi hello')
+    assert events == ['callback', 'closed']
+
+
+def test_ainvoke_line_subcommand():
+    events = []
+
+    @line_command()
+    @click.group()
+    @click.option('-2', '--two/--no-two')
+    @click.pass_context
+    async def cmd1(ctx, two):
+        ctx.call_on_close(lambda: events.append('group closed'))
+        events.append(('group', two))
+
+    @cmd1.command()
+    @trailer_argument('trailer')
+    async def scmd1(trailer):
+        await asyncio.sleep(0)
+        events.append(('scmd1', trailer))
+        return trailer
+
+    assert run(cmd1.ainvoke_line(u'-2 scmd1 hi hello')) == u'hi hello'
+    assert events == [
+        ('group', True), ('scmd1', u'hi hello'), 'group closed']
+
+
+def test_ainvoke_line_concurrent():
+    @line_command()
+    @click.command()
+    @click.argument('delay', type=float)
+    @trailer_argument('trailer')
+    async def cmd1(delay, trailer):
+        await asyncio.sleep(delay)
+        return trailer
+
+    async def main():
+        return await asyncio.gather(
+            cmd1.ainvoke_line(u'0.02 slow'),
+            cmd1.ainvoke_line(u'0 fast'))
+
+    assert run(main()) == [u'slow', u'fast']
+
+
+def test_ainvoke_line_sync_callback():
+    @line_command()
+    @click.command()
+    @trailer_argument('trailer')
+    def cmd1(trailer):
+        return trailer
+
+    assert run(cmd1.ainvoke_line(u'hi hello')) == u'hi hello'
+
+
+def test_ainvoke_line_timing_hook():
+    timings = []
+
+    @line_command(timing_hook=lambda *a: timings.append(a))
+    @click.command()
+    async def cmd1():
+        await asyncio.sleep(0.02)
+
+    run(cmd1.ainvoke_line(u''))
+    [(stage, cmd, seconds)] = [t for t in timings if t[0] == 'callback']
+    assert cmd is cmd1
+    assert seconds >= 0.015
+
+
+def test_ainvoke_line_chain():
+    events = []
+
+    @line_command()
+    @click.group(chain=True)
+    @click.pass_context
+    def cmd1(ctx):
+        ctx.call_on_close(lambda: events.append('group closed'))
+
+    @cmd1.resultcallback()
+    async def cmd1_result(results):
+        await asyncio.sleep(0)
+        return sorted(results)
+
+    @cmd1.command()
+    @click.argument('arg')
+    async def scmd1(arg):
+        await asyncio.sleep(0)
+        if arg == u'boom':
+            raise ValueError(arg)
+        return arg
+
+    assert run(cmd1.ainvoke_line(u'scmd1 b scmd1 a')) == [u'a', u'b']
+    assert events == ['group closed']
+    with pytest.raises(ValueError):
+        run(cmd1.ainvoke_line(u'scmd1 boom'))
+    assert events == ['group closed'] * 2
+
+
+class ParsingGroup(click.Group):
+    def parse_args(self, ctx, args):
+        return click.Group.parse_args(self, ctx, args)
+
+
+def test_ainvoke_line_overridden_methods():
+    @line_command()
+    @click.group()
+    def cmd1():
+        pass
+
+    @cmd1.group(cls=ParsingGroup)
+    def scmd1():
+        pass
+
+    @scmd1.command()
+    def sscmd1():
+        return 'sscmd1'
+
+    assert cmd1.invoke_line(u'scmd1 sscmd1') == 'sscmd1'
+    with pytest.raises(TypeError):
+        run(cmd1.ainvoke_line(u'scmd1 sscmd1'))
+
+
+def test_read_stream():
+    events = []
+
+    @line_command()
+    @click.command()
+    @click.argument('n', type=int)
+    @trailer_argument('trailer')
+    async def cmd1(n, trailer):
+        await asyncio.sleep(0)
+        events.append((n, trailer))
+
+    async def main():
+        reader = asyncio.StreamReader()
+        for i in range(200):
+            reader.feed_data(b'%d hi  there\r\n' % (i,))
+        reader.feed_data(b'200 end')
+        reader.feed_eof()
+        await read_stream(reader, cmd1.ainvoke_line, size=64)
+
+    run(main())
+    assert events == [(i, u'hi  there') for i in range(200)] + [(200, u'end')]
@@ -0,0 +1,162 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+import array
+import bisect
+import re
+
+from irclick._splut import (
+    _BYTE_WORD, _WORD, ByteLine, LineView, Splut, SplutStream, is_bytes,
+    scannable)
+
+
+try:
+    array.array('q')
+except ValueError:
+    _TYPECODE = 'l'
+else:
+    _TYPECODE = 'q'
+
+_NEWLINE = re.compile(u'\n')
+_BYTE_NEWLINE = re.compile(b'\n')
+_numpy = []
+
+
+def _import_numpy():
+    """Returns :mod:`numpy` and a table of which bytes are whitespace, or
+    `None` if NumPy isn't installed.  It's imported on first use, since it
+    takes far longer to import than the rest of irclick put together.
+    """
+    if not _numpy:
+        try:
+            import numpy
+        except ImportError:
+            _numpy.append(None)
+        else:
+            # The bytes that a bytes pattern's \s matches.
+            space = numpy.zeros(256, dtype=bool)
+            space[[ord(c) for c in ' \t\n\r\f\v']] = True
+            _numpy.append((numpy, space))
+    return _numpy[0]
+
+
+class TokenizedBlock(object):
+    """A block of newline-separated lines, with the offsets of each line and
+    of every word in it worked out ahead of time.
+
+    Line `i` runs from ``line_starts[i]`` to ``line_ends[i]``, not counting
+    its CR LF or LF, and its words are the ones numbered from
+    ``line_words[i]`` up to ``line_words[i + 1]``, each of which runs from
+    ``word_starts[j]`` to ``word_ends[j]``.  All of the offsets are into
+    `buffer`, and they're kept as flat arrays: NumPy arrays if they were
+    computed with NumPy, or :class:`array.array`\\s otherwise.
+
+    Empty lines are kept, so the index of a line is its line number in the
+    block, counting from zero.
+    """
+
+    def __init__(self, buffer, line_starts, line_ends, line_words,
+                 word_starts, word_ends):
+        self.buffer = buffer
+        self.line_starts = line_starts
+        self.line_ends = line_ends
+        self.line_words = line_words
+        self.word_starts = word_starts
+        self.word_ends = word_ends
+
+    def __len__(self):
+        return len(self.line_starts)
+
+    def line(self, i):
+        """Returns ``(pos, endpos)`` for line `i` in `buffer`."""
+        return int(self.line_starts[i]), int(self.line_ends[i])
+
+    def args_of_line(self, i, **decoding):
+        """Returns the words of line `i`, as :meth:`Splut.args_of_line`
+        would, but without splitting the line again.
+        """
+        endpos = int(self.line_ends[i])
+        if is_bytes(self.buffer):
+            line = ByteLine(self.buffer, endpos, **decoding)
+        else:
+            line = LineView(self.buffer, endpos)
+        first, last = int(self.line_words[i]), int(self.line_words[i + 1])
+        starts = self.word_starts[first:last].tolist()
+        ends = self.word_ends[first:last].tolist()
+        return SplutStream(
+            Splut(line, start, end) for start, end in zip(starts, ends))
+
+
+def tokenize_block(buffer, use_numpy=None):
+    """Splits every line of `buffer` into words in one pass over the whole
+    block, returning a :class:`TokenizedBlock`.
+
+    `buffer` can be text, or bytes of any kind including an
+    :class:`mmap.mmap`, which is split the way :meth:`Splut.args_of_line`
+    splits lines of bytes: on ASCII whitespace, without decoding anything.
+    Bytes are split with NumPy if it's installed, unless `use_numpy` is
+    false; if it's true, NumPy is required.  Text is always split with
+    :mod:`re`.
+    """
+    if is_bytes(buffer) and use_numpy is not False:
+        imported = _import_numpy()
+        if imported is not None:
+            return _tokenize_numpy(buffer, *imported)
+        elif use_numpy:
+            raise ImportError('numpy is not installed')
+    if is_bytes(buffer):
+        return _tokenize_re(
+            scannable(buffer), _BYTE_WORD, _BYTE_NEWLINE, b'\r')
+    else:
+        return _tokenize_re(buffer, _WORD, _NEWLINE, u'\r')
+
+
+def _tokenize_re(buffer, word, newline, cr):
+    n = len(buffer)
+    line_starts = array.array(_TYPECODE, [0])
+    line_ends = array.array(_TYPECODE)
+    for m in newline.finditer(buffer):
+        line_ends.append(m.start())
+        line_starts.append(m.end())
+    line_ends.append(n)
+    if line_starts[-1] == n:
+        line_starts.pop()
+        line_ends.pop()
+    for i, (start, end) in enumerate(zip(line_starts, line_ends)):
+        if end > start and buffer[end - 1:end] == cr:
+            line_ends[i] = end - 1
+
+    word_starts = array.array(_TYPECODE)
+    word_ends = array.array(_TYPECODE)
+    for m in word.finditer(buffer):
+        word_starts.append(m.start())
+        word_ends.append(m.end())
+    line_words = array.array(_TYPECODE, (
+        bisect.bisect_left(word_starts, start) for start in line_starts))
+    line_words.append(len(word_starts))
+    return TokenizedBlock(
+        buffer, line_starts, line_ends, line_words, word_starts, word_ends)
+
+
+def _tokenize_numpy(buffer, numpy, space_table):
+    data = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    n = len(data)
+    newlines = numpy.flatnonzero(data == 10)
+    line_starts = numpy.concatenate(([0], newlines + 1)).astype(numpy.int64)
+    line_ends = numpy.concatenate((newlines, [n])).astype(numpy.int64)
+    if line_starts[-1] == n:
+        line_starts, line_ends = line_starts[:-1], line_ends[:-1]
+    if n:
+        before_end = data[numpy.maximum(line_ends - 1, 0)]
+        line_ends -= (line_ends > line_starts) & (before_end == 13)
+
+    # Padding with spaces on both sides makes every word start where the
+    # space mask goes from true to false and end where it goes back.
+    space = numpy.concatenate(([True], space_table[data], [True]))
+    edges = numpy.diff(space.view(numpy.int8))
+    word_starts = numpy.flatnonzero(edges == -1)
+    word_ends = numpy.flatnonzero(edges == 1)
+    line_words = numpy.append(
+        numpy.searchsorted(word_starts, line_starts), len(word_starts))
+    return TokenizedBlock(
+        buffer, line_starts, line_ends, line_words, word_starts, word_ends)
@@ -0,0 +1,94 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+import mmap
+import tempfile
+
+import click
+import pytest
+
+from irclick import line_command, tokenize_block, trailer_argument
+from irclick._batch import _import_numpy
+from irclick._splut import Splut
+
+
+BLOCK = (b'-1 hey hi  there\r\n'
+         b'\n'
+         b'   \t \r\n'
+         b'h\xc3\xa9llo  w\xc3\xb6rld \n'
+         b'-1 last line')
+
+needs_numpy = pytest.mark.skipif(
+    _import_numpy() is None, reason='numpy is not installed')
+
+
+@pytest.fixture(params=[
+    False, pytest.param(True, marks=needs_numpy)],
+    ids=['re', 'numpy'])
+def use_numpy(request):
+    return request.param
+
+
+def words_of(block, **decoding):
+    return [[s.string for s in block.args_of_line(i, **decoding)]
+            for i in range(len(block))]
+
+
+@pytest.mark.parametrize('buffer', [
+    BLOCK, BLOCK + b'\n', BLOCK + b'\r\n', b'', b'\n', b'one', b'a\n\nb \n',
+    b'  lead\r\n\r\n\rx\r'])
+def test_matches_args_of_line(use_numpy, buffer):
+    block = tokenize_block(buffer, use_numpy=use_numpy)
+    lines = buffer.split(b'\n')
+    if lines[-1] == b'':
+        lines.pop()
+    lines = [l[:-1] if l.endswith(b'\r') else l for l in lines]
+    assert [buffer[slice(*block.line(i))] for i in range(len(block))] == lines
+    assert words_of(block) == [
+        [s.string for s in Splut.args_of_line(l)] for l in lines]
+
+
+def test_text():
+    block = tokenize_block(BLOCK.decode('utf-8'))
+    assert len(block) == 5
+    assert words_of(block)[3] == [u'h\xe9llo', u'w\xf6rld']
+    assert next(block.args_of_line(0)).trailer == u'-1 hey hi  there'
+
+
+def test_trailers_stop_at_line_end(use_numpy):
+    block = tokenize_block(BLOCK, use_numpy=use_numpy)
+    words = block.args_of_line(3, fallback_encoding=None)
+    assert next(words).trailer == u'h\xe9llo  w\xf6rld '
+
+
+def test_mmap(use_numpy):
+    with tempfile.TemporaryFile() as f:
+        f.write(BLOCK)
+        f.flush()
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            block = tokenize_block(mapped, use_numpy=use_numpy)
+            assert words_of(block) == words_of(tokenize_block(BLOCK))
+            del block
+        finally:
+            mapped.close()
+
+
+def test_invoke_block(use_numpy):
+    @line_command()
+    @click.command()
+    @click.option('-1', '--one', required=True)
+    @trailer_argument('trailer')
+    def cmd1(one, trailer):
+        return one, trailer
+
+    block = tokenize_block(
+        BLOCK + b'\n--help\n-1 after help', use_numpy=use_numpy)
+    results = list(cmd1.invoke_block(block))
+    assert [r.line for r in results] == [0, 1, 2, 3, 4, 5, 6]
+    assert results[0].result == (u'hey', u'hi  there')
+    assert results[4].result == (u'last', u'line')
+    assert isinstance(results[5].error, SystemExit)
+    assert results[6].result == (u'after', u'help')
+    assert [r.error is not None for r in results] == [
+        False, True, True, True, False, True, False]
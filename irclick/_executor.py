@@ -0,0 +1,124 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+import functools
+import threading
+from collections import deque
+from concurrent.futures import CancelledError, Future
+
+
+class OrderedExecutor(object):
+    """Runs work on a :class:`concurrent.futures.Executor` such that
+    everything submitted with the same key runs in submission order, one at
+    a time, while work for different keys runs in parallel.
+
+    The key is usually the channel or nick a line came from, so that a slow
+    command in one channel doesn't hold up any other channel, but the lines
+    of a single channel are still answered in order.
+
+    :param executor: the executor to run work on.  Since line commands can
+                     rarely be pickled, :meth:`submit_line` needs a thread
+                     pool; :meth:`submit` works with any executor as long as
+                     its arguments can be sent to it.
+    """
+
+    def __init__(self, executor):
+        self._executor = executor
+        self._lock = threading.Lock()
+        #: Notified when the last key's work is done.
+        self._idle = threading.Condition(self._lock)
+        #: Keys with work in progress, mapped to their queued work.
+        self._queues = {}
+        self._shutdown = False
+        #: Whether to shut `_executor` down once there's no work left.
+        self._shutdown_when_idle = False
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Schedules ``fn(*args, **kwargs)`` to run after everything already
+        submitted for `key`, and returns a :class:`~concurrent.futures.Future`
+        for its result.
+        """
+        future = Future()
+        job = future, fn, args, kwargs
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError(
+                    'cannot schedule new futures after shutdown')
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.append(job)
+                return future
+            self._queues[key] = deque()
+        self._start(key, job)
+        return future
+
+    def submit_line(self, key, cmd, line, **kw):
+        """Schedules ``cmd.invoke_line(line, **kw)``, ordered by `key`."""
+        return self.submit(key, cmd.invoke_line, line, **kw)
+
+    def shutdown(self, wait=True):
+        """Stops accepting work, and shuts down the executor once the work
+        already queued for every key has been run.  With `wait`, that
+        happens before this returns; otherwise the executor is shut down by
+        whichever thread finishes the last of the work.
+        """
+        with self._lock:
+            self._shutdown = True
+            if wait:
+                while self._queues:
+                    self._idle.wait()
+            elif self._queues:
+                self._shutdown_when_idle = True
+                return
+        self._executor.shutdown(wait=wait)
+
+    def _start(self, key, job):
+        while job is not None:
+            future, fn, args, kwargs = job
+            if future.set_running_or_notify_cancel():
+                try:
+                    inner = self._executor.submit(fn, *args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    # Whichever of this loop and the done callback gets to
+                    # the handoff second goes on to the next job.  If the
+                    # work is already done, the callback runs right away and
+                    # that's this loop, so a run of work which finishes
+                    # immediately doesn't recurse.
+                    handoff = []
+                    inner.add_done_callback(functools.partial(
+                        self._finished, key, future, handoff))
+                    if not self._hand_off(handoff):
+                        return
+            job = self._next_job(key)
+
+    def _hand_off(self, handoff):
+        with self._lock:
+            handoff.append(None)
+            return len(handoff) == 2
+
+    def _finished(self, key, future, handoff, inner):
+        if inner.cancelled():
+            future.set_exception(CancelledError())
+        elif inner.exception() is not None:
+            future.set_exception(inner.exception())
+        else:
+            future.set_result(inner.result())
+        if self._hand_off(handoff):
+            self._start(key, self._next_job(key))
+
+    def _next_job(self, key):
+        with self._lock:
+            queue = self._queues[key]
+            if queue:
+                return queue.popleft()
+            del self._queues[key]
+            if self._queues:
+                return None
+            self._idle.notify_all()
+            shutdown, self._shutdown_when_idle = (
+                self._shutdown_when_idle, False)
+        if shutdown:
+            self._executor.shutdown(wait=False)
+        return None
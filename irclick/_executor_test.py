@@ -0,0 +1,140 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+
+import click
+import pytest
+
+from irclick import OrderedExecutor, line_command, trailer_argument
+
+
+@pytest.fixture
+def executor():
+    executor = OrderedExecutor(ThreadPoolExecutor(max_workers=4))
+    yield executor
+    executor.shutdown()
+
+
+def test_same_key_runs_in_order(executor):
+    ran = []
+
+    @line_command()
+    @click.command()
+    @click.argument('delay', type=float)
+    @trailer_argument('trailer')
+    def cmd1(delay, trailer):
+        time.sleep(delay)
+        ran.append(trailer)
+        return trailer
+
+    futures = [
+        executor.submit_line('#chan', cmd1, u'%s line %d' % (delay, i))
+        for i, delay in enumerate([0.03, 0, 0.01, 0])]
+    assert [f.result(timeout=5) for f in futures] == [
+        u'line 0', u'line 1', u'line 2', u'line 3']
+    assert ran == [u'line 0', u'line 1', u'line 2', u'line 3']
+
+
+def test_different_keys_run_in_parallel(executor):
+    other_ran = threading.Event()
+
+    def waits():
+        assert other_ran.wait(timeout=5)
+        return 'waited'
+
+    first = executor.submit('#one', waits)
+    second = executor.submit('#two', other_ran.set)
+    assert first.result(timeout=5) == 'waited'
+    assert second.result(timeout=5) is None
+
+
+def test_errors_do_not_block_key(executor):
+    def fails():
+        raise ValueError('nope')
+
+    first = executor.submit('#chan', fails)
+    second = executor.submit('#chan', lambda: 'fine')
+    with pytest.raises(ValueError):
+        first.result(timeout=5)
+    assert second.result(timeout=5) == 'fine'
+
+
+def test_cancelled_work_is_skipped(executor):
+    release = threading.Event()
+    ran = []
+
+    first = executor.submit('#chan', release.wait, 5)
+    second = executor.submit('#chan', ran.append, 'second')
+    third = executor.submit('#chan', ran.append, 'third')
+    assert second.cancel()
+    release.set()
+    third.result(timeout=5)
+    assert first.result(timeout=5)
+    assert ran == ['third']
+
+
+class HeldExecutor(Executor):
+    """Holds on to work until it's released, and after that runs work as
+    soon as it's submitted, in the thread that submits it.
+    """
+
+    def __init__(self):
+        self.held = []
+        self.shut_down = False
+
+    def submit(self, fn, *args, **kwargs):
+        if self.shut_down:
+            raise RuntimeError('cannot schedule new futures after shutdown')
+        future = Future()
+        if self.held is None:
+            self._run(future, fn, args, kwargs)
+        else:
+            self.held.append((future, fn, args, kwargs))
+        return future
+
+    def release(self):
+        held, self.held = self.held, None
+        for job in held:
+            self._run(*job)
+
+    def _run(self, future, fn, args, kwargs):
+        future.set_running_or_notify_cancel()
+        future.set_result(fn(*args, **kwargs))
+
+    def shutdown(self, wait=True):
+        self.shut_down = True
+
+
+def test_finished_work_does_not_recurse():
+    inner = HeldExecutor()
+    executor = OrderedExecutor(inner)
+    futures = [executor.submit('#chan', lambda i=i: i) for i in range(5000)]
+    inner.release()
+    assert [f.result(timeout=5) for f in futures] == list(range(5000))
+
+
+def test_shutdown_runs_queued_work():
+    executor = OrderedExecutor(ThreadPoolExecutor(max_workers=2))
+    release = threading.Event()
+    first = executor.submit('#chan', release.wait, 5)
+    second = executor.submit('#chan', lambda: 'second')
+    threading.Timer(0.05, release.set).start()
+    executor.shutdown()
+    assert first.result(timeout=5)
+    assert second.result(timeout=5) == 'second'
+    with pytest.raises(RuntimeError):
+        executor.submit('#chan', lambda: None)
+
+
+def test_shutdown_without_waiting():
+    inner = HeldExecutor()
+    executor = OrderedExecutor(inner)
+    futures = [executor.submit('#chan', lambda i=i: i) for i in range(3)]
+    executor.shutdown(wait=False)
+    assert not inner.shut_down
+    inner.release()
+    assert [f.result(timeout=5) for f in futures] == [0, 1, 2]
+    assert inner.shut_down
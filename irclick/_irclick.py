@@ -1,15 +1,23 @@
 # Copyright (c) Aaron Gallagher <_@habnab.it>
 # See LICENSE for details.
 
-import contextlib
+import collections
 import functools
+import sys
+import time
+import weakref
 
 import click
+from click.core import iter_params_for_processing
+from click.parser import split_opt
 from click.utils import make_str as _make_str
-from contextlib2 import ExitStack
 
-from irclick._parser import OptionParser
-from irclick._splut import Splut
+from irclick._lru import LRUCache
+from irclick._parser import ArgumentLayout, OptionParser
+from irclick._splut import ByteLine, Splut, SplutStream
+
+
+clock = getattr(time, 'perf_counter', time.time)
 
 
 def make_str(value):
@@ -19,47 +27,700 @@ def make_str(value):
         return _make_str(value)
 
 
-def invoke_line(cmd, parser_kw, line, **kw):
-    args = Splut.args_of_line(line)
-    with ExitStack() as stack:
-        stack.enter_context(patch(click.core, 'make_str', make_str))
-        patch_all_parsers(stack, cmd, parser_kw)
-        with cmd.make_context('bogus', args=args, **kw) as ctx:
-            return cmd.invoke(ctx)
+def _method(cls, name):
+    method = getattr(cls, name)
+    # Unbound methods on py2 are made anew each time they're looked up.
+    return getattr(method, '__func__', method)
 
 
-def make_parser(cmd, parser_kw, ctx):
-    parser = OptionParser(ctx, **parser_kw)
-    parser.allow_interspersed_args = ctx.allow_interspersed_args
-    parser.ignore_unknown_options = ctx.ignore_unknown_options
-    for param in cmd.get_params(ctx):
-        param.add_to_parser(parser, ctx)
-    return parser
+def overrides(cmd, base, name):
+    """Returns whether the class of `cmd` overrides `base`'s method `name`.
+    """
+    return _method(type(cmd), name) is not _method(base, name)
+
+
+def overridden_methods(cmd):
+    """Returns the names of the methods which irclick does in its own way
+    for `cmd`, but which `cmd`'s class overrides, such as the
+    :meth:`parse_args` of a group which picks a default subcommand.
+    """
+    if isinstance(cmd, click.MultiCommand):
+        base, names = click.MultiCommand, ('make_context', 'parse_args',
+                                           'invoke')
+    else:
+        base, names = click.Command, ('make_context', 'parse_args')
+    return frozenset(name for name in names if overrides(cmd, base, name))
+
+
+class ListParser(object):
+    """Wraps an irclick parser for click's own :meth:`parse_args`, which
+    needs the leftover arguments as a list.
+    """
+
+    def __init__(self, parser):
+        self._parser = parser
+
+    def parse_args(self, args):
+        opts, args, order = self._parser.parse_args(args)
+        return opts, list(args), order
+
 
+def fallback_parser(cache, cmd, ctx):
+    """The :meth:`make_parser` of a command whose own methods are called
+    instead of irclick's, so that they still parse with irclick's parser.
+    """
+    parser, _ = cache.parser_for(cmd, ctx)
+    return ListParser(parser)
 
-@contextlib.contextmanager
-def patch(obj, attr, value):
-    prev = getattr(obj, attr)
+
+def timed(cache, stage, cmd, fn, *args, **kw):
+    """Calls ``fn(*args, **kw)``, reporting how long it took as `stage` of
+    running `cmd` to the cache's timing hook, if there is one.
+    """
+    hook = cache.timing_hook
+    if hook is None:
+        return fn(*args, **kw)
+    start = clock()
     try:
-        setattr(obj, attr, value)
-        yield
+        return fn(*args, **kw)
     finally:
-        setattr(obj, attr, prev)
+        hook(stage, cmd, clock() - start)
 
 
-def patch_all_parsers(stack, cmd, parser_kw):
-    stack.enter_context(patch(cmd, 'make_parser',
-                              functools.partial(make_parser, cmd, parser_kw)))
-    if isinstance(cmd, click.MultiCommand):
-        for subcmd in cmd.list_commands(None):
-            patch_all_parsers(stack, cmd.get_command(None, subcmd), parser_kw)
+def invoke_line(cmd, cache, line, pos=0, endpos=None, **kw):
+    """Parses `line` and invokes `cmd` with it.
+
+    If `pos` or `endpos` are given, only that part of `line` is used, and
+    it isn't copied out of `line` to do so.
+    """
+    args = cache.args_of_line(line, pos, endpos)
+    record = ParseRecord.for_line(cache, line, pos, endpos, kw)
+    result = invoke_args(cmd, cache, args, record, **kw)
+    if record is not None:
+        record.save(cache)
+    return result
+
+
+def invoke_args(cmd, cache, args, record=None, **kw):
+    """Invokes `cmd` with the words `args`, which have already been split
+    out of a line.
+    """
+    with make_context(cache, cmd, 'bogus', args, record=record, **kw) as ctx:
+        return invoke(cache, cmd, ctx)
+
+
+#: The context settings which change how a line is parsed.
+PARSE_SETTINGS = frozenset([
+    'allow_extra_args', 'allow_interspersed_args', 'help_option_names',
+    'ignore_unknown_options', 'resilient_parsing', 'token_normalize_func'])
+
+
+class ParseRecord(object):
+    """The parser results of each command a line went through, in order.
+
+    When a line command has a parse cache, a line's record is saved in it
+    after the line has been invoked successfully.  The next time the same
+    line comes in, the saved results are handed out again instead of
+    running the parsers.  Everything after parsing, from type conversion
+    through to the callbacks, still runs every time.
+
+    The words left over from parsing are recorded as words of the key, which
+    is only the part of `line` from `pos` that was parsed, so that a cached
+    record doesn't keep the rest of a bigger line, like the tags of an IRC
+    message, alive.
+    """
+
+    def __init__(self, key, parses=None, line=None, pos=0):
+        self.key = key
+        self.replaying = parses is not None
+        self.parses = [] if parses is None else parses
+        self.line = line
+        self.pos = pos
+        self._key_line = None
+        self._position = 0
+
+    @classmethod
+    def for_line(cls, cache, line, pos, endpos, kw):
+        """Returns a record for replaying or recording the part of `line`
+        from `pos` to `endpos`, or `None` if the parse cache isn't in use.
+        Lines invoked with any of the context settings in
+        :data:`PARSE_SETTINGS` don't use it, since those can change how
+        they're parsed; others, like `obj`, are fine.
+        """
+        if cache.parse_cache is None or not PARSE_SETTINGS.isdisjoint(kw):
+            return None
+        if not isinstance(line, (bytes, type(u''))):
+            # Buffers can change after they've been used as a key.
+            return None
+        key = line
+        if pos != 0 or endpos is not None:
+            key = line[pos:endpos]
+        return cls(key, cache.parse_cache.get(key), line, pos)
+
+    def _rebase(self, splut):
+        """Returns `splut` as a word of the key instead of the whole line."""
+        line = splut.line
+        if self.key is self.line or getattr(
+                line, 'buffer', line) is not self.line:
+            return splut
+        if self._key_line is None:
+            if isinstance(line, ByteLine):
+                self._key_line = ByteLine(
+                    self.key, None, line.encoding, line.errors,
+                    line.fallback_encoding)
+            else:
+                self._key_line = self.key
+        return Splut(
+            self._key_line, splut.start - self.pos, splut.end - self.pos)
+
+    def parse(self, parser, args):
+        if self._position < len(self.parses):
+            opts, rest, order = self.parses[self._position]
+        else:
+            opts, rest, order = parser.parse_args(args)
+            rest = [self._rebase(Splut.ensure(arg)) for arg in rest]
+            self.parses.append((opts, rest, order))
+        self._position += 1
+        return dict(opts), SplutStream(rest), list(order)
+
+    def save(self, cache):
+        if self.replaying:
+            return
+        size = sys.getsizeof(self.key) + sum(
+            sys.getsizeof(opts) + sum(map(sys.getsizeof, opts.values())) +
+            sys.getsizeof(rest) + sum(map(sys.getsizeof, rest)) +
+            sys.getsizeof(order)
+            for opts, rest, order in self.parses)
+        cache.parse_cache.put(self.key, self.parses, size)
+
+
+LineResult = collections.namedtuple('LineResult', ['line', 'result', 'error'])
+
+#: What a single line can raise without stopping a batch of them.  Besides
+#: errors, that's the :exc:`SystemExit` click raises from
+#: :meth:`click.Context.exit`, as it does after showing ``--help``.
+LINE_ERRORS = Exception, SystemExit
+
+
+def invoke_lines(cmd, cache, lines, **kw):
+    """Invokes `cmd` on each of `lines` in turn, yielding a
+    :class:`LineResult` for each as it finishes.  A line which raises an
+    exception, or exits the way ``--help`` does, has that as its `error`
+    instead of stopping the rest of the lines from being run.
+    """
+    for line in lines:
+        try:
+            result = invoke_line(cmd, cache, line, **kw)
+        except LINE_ERRORS as e:
+            yield LineResult(line, None, e)
+        else:
+            yield LineResult(line, result, None)
+
+
+def invoke_block(cmd, cache, block, **kw):
+    """Like :func:`invoke_lines`, but for each line of the
+    :class:`TokenizedBlock` `block`, using the words it already found
+    instead of splitting each line again.  The `line` of each
+    :class:`LineResult` is the index of the line in `block`.
+    """
+    for i in range(len(block)):
+        try:
+            result = invoke_args(
+                cmd, cache, block.args_of_line(i, **cache.decoding), **kw)
+        except LINE_ERRORS as e:
+            yield LineResult(i, None, e)
+        else:
+            yield LineResult(i, result, None)
+
+
+ParsedLine = collections.namedtuple('ParsedLine', ['path', 'values', 'args'])
+
+
+class ParseContext(object):
+    """Just enough of a :class:`click.Context` to compile and run a command's
+    parser, inheriting settings from its parent the same way.
+    """
+
+    def __init__(self, command, parent=None, info_name=None, obj=None,
+                 resilient_parsing=False, allow_extra_args=None,
+                 allow_interspersed_args=None, ignore_unknown_options=None,
+                 help_option_names=None, token_normalize_func=None, **extra):
+        self.command = command
+        self.parent = parent
+        self.info_name = info_name
+        if obj is None and parent is not None:
+            obj = parent.obj
+        self.obj = obj
+        self.resilient_parsing = resilient_parsing
+        if allow_extra_args is None:
+            allow_extra_args = command.allow_extra_args
+        self.allow_extra_args = allow_extra_args
+        if allow_interspersed_args is None:
+            allow_interspersed_args = command.allow_interspersed_args
+        self.allow_interspersed_args = allow_interspersed_args
+        if ignore_unknown_options is None:
+            ignore_unknown_options = command.ignore_unknown_options
+        self.ignore_unknown_options = ignore_unknown_options
+        if help_option_names is None:
+            if parent is not None:
+                help_option_names = parent.help_option_names
+            else:
+                help_option_names = ['--help']
+        self.help_option_names = help_option_names
+        if token_normalize_func is None and parent is not None:
+            token_normalize_func = parent.token_normalize_func
+        self.token_normalize_func = token_normalize_func
+
+    def fail(self, message):
+        raise click.UsageError(message)
+
+
+def parse_line(cmd, cache, line, pos=0, endpos=None, **kw):
+    """Parses `line` for `cmd` without making any click contexts or invoking
+    any callbacks.
+
+    Returns a :class:`ParsedLine` whose `path` is the names of the commands
+    the line resolved to, starting with `cmd` itself, and whose `values` are
+    the matching dicts of option and argument values, exactly as the
+    parser produced them; no types, defaults or callbacks have been applied.
+    `args` are any extra arguments left over at the end.  `pos` and
+    `endpos` work as they do for :func:`invoke_line`.
+    """
+    path, values = [], []
+    args = cache.args_of_line(line, pos, endpos)
+    ctx = None
+    group = None
+    cmd_name = cmd.name
+    extra = kw
+    while True:
+        settings = dict(cmd.context_settings)
+        settings.update(extra)
+        ctx = ParseContext(cmd, parent=ctx, info_name=cmd_name, **settings)
+        parser, _ = cache.parser_for(cmd, ctx)
+        opts, args, _ = timed(cache, 'parse', cmd, parser.parse_args, args)
+        path.append(cmd_name)
+        values.append(opts)
+
+        if isinstance(cmd, click.MultiCommand):
+            if not args:
+                if cmd.invoke_without_command:
+                    break
+                raise click.UsageError('Missing command.')
+            if cmd.chain:
+                group, extra = ctx, dict(
+                    allow_extra_args=True, allow_interspersed_args=False)
+            else:
+                group, extra = None, {}
+        elif group is not None and args:
+            ctx = group
+        else:
+            break
+
+        if overrides(ctx.command, click.MultiCommand, 'resolve_command'):
+            cmd_name, cmd = resolve_overridden(ctx.command, ctx, args)
+        else:
+            original_cmd_name = make_str(next(args))
+            cmd_name, cmd = cache.get_command(
+                ctx.command, ctx, original_cmd_name)
+            if cmd is None:
+                raise click.UsageError(
+                    'No such command "%s".' % original_cmd_name)
+
+    args = [make_str(arg) for arg in args]
+    if args and not ctx.allow_extra_args and not ctx.resilient_parsing:
+        raise click.UsageError(
+            'Got unexpected extra argument%s (%s)'
+            % (len(args) != 1 and 's' or '', ' '.join(args)))
+    return ParsedLine(tuple(path), tuple(values), args)
+
+
+#: The key in a context's meta which says that it's being invoked by
+#: ``ainvoke_line``.
+ASYNCHRONOUS = 'irclick.asynchronous'
+
+
+def make_context(cache, cmd, info_name, args, parent=None, record=None,
+                 asynchronous=False, **extra):
+    """The equivalent of :meth:`click.BaseCommand.make_context`, except that
+    the arguments are parsed by the cached irclick parser.  Nothing global
+    is patched, so any number of threads can be doing this at once.
+
+    A :class:`ParseRecord` passed as `record` is shared with every context
+    made below this one.
+
+    If `cmd` overrides :meth:`make_context` or :meth:`parse_args`, those
+    are called instead, with a list of the words left in the line, and they
+    parse with irclick's parser through the :meth:`make_parser` that
+    :meth:`ParserCache.overridden` gave `cmd`.  That can't be done when
+    invoking `asynchronously`, since an overridden :meth:`invoke` can't be
+    awaited, so it raises :exc:`TypeError` instead.
+    """
+    if parent is not None:
+        asynchronous = parent.meta.get(ASYNCHRONOUS, False)
+    overridden = cache.overridden(cmd)
+    if overridden and asynchronous:
+        raise TypeError('%s overrides %s, so ainvoke_line can\'t invoke it'
+                        % (type(cmd).__name__, ', '.join(sorted(overridden))))
+    if 'make_context' in overridden:
+        return timed(cache, 'context', cmd, cmd.make_context,
+                     info_name, list(args), parent=parent, **extra)
+
+    for key, value in cmd.context_settings.items():
+        if key not in extra:
+            extra[key] = value
+    ctx = timed(cache, 'context', cmd, click.Context,
+                cmd, info_name=info_name, parent=parent, **extra)
+    if record is not None:
+        ctx.meta[ParseRecord] = record
+    if asynchronous:
+        ctx.meta[ASYNCHRONOUS] = True
+    with ctx.scope(cleanup=False):
+        if 'parse_args' in overridden:
+            cmd.parse_args(ctx, list(args))
+        else:
+            parse_args(cache, cmd, ctx, args)
+    return ctx
+
+
+def parse_args(cache, cmd, ctx, args):
+    multi = isinstance(cmd, click.MultiCommand)
+    if multi and not args and cmd.no_args_is_help and not ctx.resilient_parsing:
+        click.echo(ctx.get_help(), color=ctx.color)
+        ctx.exit()
+
+    parser, params = cache.parser_for(cmd, ctx)
+    record = ctx.meta.get(ParseRecord)
+    if record is None:
+        opts, args, param_order = timed(
+            cache, 'parse', cmd, parser.parse_args, args)
+    else:
+        opts, args, param_order = timed(
+            cache, 'parse', cmd, record.parse, parser, args)
+    args = timed(cache, 'params', cmd, process_params,
+                 ctx, params, opts, args, param_order)
+
+    if not multi:
+        args = list(args)
+    if args and not ctx.allow_extra_args and not ctx.resilient_parsing:
+        args = list(args)
+        ctx.fail('Got unexpected extra argument%s (%s)'
+                 % (len(args) != 1 and 's' or '',
+                    ' '.join(map(make_str, args))))
+
+    # The rest of a group's line is left as a SplutStream, so that only the
+    # subcommand's name gets split out of it here.
+    ctx.args = args
+    if multi and cmd.chain:
+        ctx.protected_args = list(args)
+        ctx.args = []
+    elif multi and args:
+        ctx.protected_args = [next(args)]
+    return ctx.args
+
+
+def process_params(ctx, params, opts, args, param_order):
+    for param in iter_params_for_processing(param_order, params):
+        value, args = param.handle_parse_result(ctx, opts, args)
+    return args
+
+
+def resolve_overridden(cmd, ctx, args):
+    """Resolves the next subcommand in `args` with `cmd`'s own
+    :meth:`resolve_command`, which only gets the subcommand's name, so that
+    the rest of the line is still split lazily.
+    """
+    cmd_name, subcmd, rest = cmd.resolve_command(ctx, [make_str(next(args))])
+    if subcmd is None:
+        ctx.fail('No such command "%s".' % cmd_name)
+    args.push(*map(Splut.ensure, rest))
+    return cmd_name, subcmd
+
+
+def resolve_command(cache, cmd, ctx, args):
+    if overrides(cmd, click.MultiCommand, 'resolve_command'):
+        cmd_name, subcmd = resolve_overridden(cmd, ctx, args)
+        return cmd_name, subcmd, args
+    original_cmd_name = make_str(next(args))
+    cmd_name, subcmd = cache.get_command(cmd, ctx, original_cmd_name)
+    if subcmd is None:
+        if split_opt(cmd_name)[0]:
+            parse_args(cache, cmd, ctx, ctx.args)
+        ctx.fail('No such command "%s".' % original_cmd_name)
+
+    return cmd_name, subcmd, args
+
+
+Call = collections.namedtuple('Call', ['cmd', 'fn', 'args'])
+Invoke = collections.namedtuple('Invoke', ['cmd', 'ctx'])
+Return = collections.namedtuple('Return', ['value'])
+
+
+def invoke_steps(cache, cmd, ctx):
+    """The equivalent of :meth:`click.MultiCommand.invoke`, except that
+    subcommands are resolved and parsed the same way as :func:`make_context`.
+    Plain commands are invoked as usual.
+
+    This is a generator, so that :func:`invoke` and ``ainvoke`` can share
+    it.  It yields a :class:`Call` for each callback to be called, and an
+    :class:`Invoke` for each subcommand to be invoked, and is sent back the
+    result; lastly it yields a :class:`Return` of the overall result.
+    """
+    if not isinstance(cmd, click.MultiCommand):
+        value = yield Call(cmd, cmd.invoke, (ctx,))
+        yield Return(value)
+        return
+    if 'invoke' in cache.overridden(cmd):
+        # click's own invoke, and whatever it calls, works with lists.
+        ctx.args = list(ctx.args)
+        value = yield Call(cmd, cmd.invoke, (ctx,))
+        yield Return(value)
+        return
+
+    def result_call(value):
+        return Call(cmd, functools.partial(
+            ctx.invoke, cmd.result_callback, value, **ctx.params), ())
+
+    if not ctx.protected_args:
+        if not cmd.invoke_without_command:
+            ctx.fail('Missing command.')
+        if not cmd.chain:
+            value = yield Call(cmd, click.Command.invoke, (cmd, ctx))
+        else:
+            with ctx:
+                yield Call(cmd, click.Command.invoke, (cmd, ctx))
+                value = []
+                if cmd.result_callback is not None:
+                    value = yield result_call(value)
+        yield Return(value)
+        return
+
+    args = SplutStream.ensure(ctx.args)
+    args.push(*ctx.protected_args)
+    ctx.args = []
+    ctx.protected_args = []
+
+    if not cmd.chain:
+        with ctx:
+            cmd_name, subcmd, args = resolve_command(cache, cmd, ctx, args)
+            ctx.invoked_subcommand = cmd_name
+            yield Call(cmd, click.Command.invoke, (cmd, ctx))
+            sub_ctx = make_context(cache, subcmd, cmd_name, args, parent=ctx)
+            with sub_ctx:
+                value = yield Invoke(subcmd, sub_ctx)
+                if cmd.result_callback is not None:
+                    value = yield result_call(value)
+        yield Return(value)
+        return
+
+    with ctx:
+        ctx.invoked_subcommand = args and '*' or None
+        yield Call(cmd, click.Command.invoke, (cmd, ctx))
+
+        contexts = []
+        while args:
+            cmd_name, subcmd, args = resolve_command(cache, cmd, ctx, args)
+            sub_ctx = make_context(cache, subcmd, cmd_name, args, parent=ctx,
+                                   allow_extra_args=True,
+                                   allow_interspersed_args=False)
+            contexts.append(sub_ctx)
+            args, sub_ctx.args = SplutStream.ensure(sub_ctx.args), []
+
+        value = []
+        for sub_ctx in contexts:
+            with sub_ctx:
+                value.append((yield Invoke(sub_ctx.command, sub_ctx)))
+        if cmd.result_callback is not None:
+            value = yield result_call(value)
+    yield Return(value)
+
+
+def invoke(cache, cmd, ctx):
+    """Invokes `cmd` in `ctx` by running the steps of
+    :func:`invoke_steps`.
+    """
+    steps = invoke_steps(cache, cmd, ctx)
+    step = next(steps)
+    while not isinstance(step, Return):
+        try:
+            if isinstance(step, Invoke):
+                value = invoke(cache, step.cmd, step.ctx)
+            else:
+                value = timed(
+                    cache, 'callback', step.cmd, step.fn, *step.args)
+        except BaseException as e:
+            # Thrown back in so that the contexts it has open get closed.
+            step = steps.throw(e)
+        else:
+            step = steps.send(value)
+    return step.value
+
+
+def compile_parser(cmd, parser_kw, ctx):
+    params = cmd.get_params(ctx)
+    parser = OptionParser(ctx, **parser_kw)
+    for param in params:
+        param.add_to_parser(parser, ctx)
+    # The parser outlives this context, and bind() gives every invocation
+    # its own anyway; holding on to it would keep its obj and parents alive.
+    parser.ctx = None
+    return parser, params
+
+
+class ParserCache(object):
+    """The compiled parsers for every command below a line command, and an
+    index of its subcommands.
+
+    A command's parser and parameters are compiled the first time it is
+    invoked and then reused.  The only context state which changes what
+    gets compiled is the token normalization function and the help option
+    names, so those are part of the key.
+
+    The index maps ``(group, name)`` to the subcommand of the group with
+    that name.  Subcommands are only looked up, and so only loaded by multi
+    commands which load them lazily, when a line names them; after that a
+    line costs a single dict lookup for each group on its own path, no
+    matter how big the tree is.  This assumes a multi command returns the
+    same subcommand for a name every time.  Adding a command to any group
+    which has been used invalidates everything.
+
+    If there's a `timing_hook`, it's called as ``timing_hook(stage, cmd,
+    seconds)`` after each stage of handling a line, for each command on the
+    line's path.  The stages are ``'context'`` for making the click context,
+    ``'parse'`` for running the parser (which is also when the line gets
+    split into words), ``'params'`` for converting values and running
+    parameter callbacks, and ``'callback'`` for the command's own callback.
+
+    Lines of bytes are decoded according to `decoding`, which are the
+    keyword arguments of :class:`ByteLine`.
+
+    If there's a `parse_cache`, it's an :class:`LRUCache` mapping lines
+    which have been invoked to the parser results a :class:`ParseRecord`
+    recorded for them.
+    """
+
+    def __init__(self, root, parser_kw, timing_hook=None, parse_cache=None,
+                 decoding=None):
+        self.root = root
+        self.parser_kw = parser_kw
+        self.decoding = decoding or {}
+        self.timing_hook = timing_hook
+        self.parse_cache = parse_cache
+        self._parsers = {}
+        self._index = {}
+        #: The groups whose add_command has been wrapped to invalidate this.
+        self._watched = weakref.WeakSet()
+        #: Commands mapped to the names of the methods they override.
+        self._overridden = weakref.WeakKeyDictionary()
+
+    def args_of_line(self, line, pos=0, endpos=None):
+        return Splut.args_of_line(line, pos, endpos, **self.decoding)
+
+    def invalidate(self):
+        self._parsers.clear()
+        self._index.clear()
+        # So that new commands below an overridden invoke get the parser.
+        self._overridden.clear()
+        if self.parse_cache is not None:
+            self.parse_cache.clear()
+
+    def parser_for(self, cmd, ctx):
+        key = cmd, ctx.token_normalize_func, tuple(ctx.help_option_names)
+        compiled = self._parsers.get(key)
+        if compiled is None:
+            if isinstance(cmd, click.Group):
+                self._watch(cmd)
+            compiled = self._parsers[key] = compile_parser(
+                cmd, self.parser_kw, ctx)
+        parser, params = compiled
+        return parser.bind(ctx), params
+
+    def overridden(self, cmd):
+        """Returns :func:`overridden_methods` of `cmd`.
+
+        The first time a command which overrides any of them is seen, its
+        :meth:`make_parser` is set to one which uses this cache's parsers,
+        since its own methods will be parsing with it.  A multi command
+        which overrides :meth:`invoke` invokes its subcommands itself, so
+        that's done for every command below it too.
+        """
+        overridden = self._overridden.get(cmd)
+        if overridden is None:
+            overridden = self._overridden[cmd] = overridden_methods(cmd)
+            if overridden:
+                self._use_fallback_parser(cmd, 'invoke' in overridden)
+        return overridden
+
+    def _use_fallback_parser(self, cmd, recurse):
+        # A command shared between line commands gets the parser of the
+        # last one to see it; they only differ by their parser settings.
+        cmd.make_parser = functools.partial(fallback_parser, self, cmd)
+        if recurse and isinstance(cmd, click.MultiCommand):
+            for name in cmd.list_commands(None):
+                subcmd = cmd.get_command(None, name)
+                if subcmd is not None:
+                    self._use_fallback_parser(subcmd, True)
+
+    def get_command(self, cmd, ctx, cmd_name):
+        """Returns ``(cmd_name, subcmd)`` for the subcommand of `cmd` named
+        `cmd_name`, falling back to the context's token normalization the
+        same way click does.  `subcmd` is `None` if there's no such command.
+        """
+        subcmd = self._lookup(cmd, ctx, cmd_name)
+        if subcmd is None and ctx.token_normalize_func is not None:
+            cmd_name = ctx.token_normalize_func(cmd_name)
+            subcmd = self._lookup(cmd, ctx, cmd_name)
+        return cmd_name, subcmd
+
+    def _lookup(self, cmd, ctx, cmd_name):
+        key = cmd, cmd_name
+        subcmd = self._index.get(key)
+        if subcmd is None:
+            # cmd's parser was compiled before it got this far, which is
+            # when it started being watched.
+            subcmd = cmd.get_command(ctx, cmd_name)
+            # Misses aren't cached, so that typos can't grow the index.
+            if subcmd is not None:
+                self._index[key] = subcmd
+        return subcmd
+
+    def _watch(self, group):
+        if group in self._watched:
+            return
+        self._watched.add(group)
+        add_command = group.add_command
+        group.add_command = functools.partial(self._add_command, add_command)
+
+    def _add_command(self, add_command, cmd, name=None):
+        add_command(cmd, name)
+        self.invalidate()
 
 
-def line_command(**kw):
-    parser_kw = {k: kw.pop(k) for k in ('opt_prefixes', 'end_of_options') if k in kw}
+def line_command(timing_hook=None, parse_cache_size=None,
+                 parse_cache_bytes=None, **kw):
+    parser_kw = {k: kw.pop(k) for k in (
+        'opt_prefixes', 'end_of_options', 'abbreviate_options',
+        'options_first') if k in kw}
+    decoding = {k: kw.pop(k) for k in (
+        'encoding', 'errors', 'fallback_encoding') if k in kw}
 
     def deco(cmd):
-        cmd.invoke_line = functools.partial(invoke_line, cmd, parser_kw)
+        # Subcommands' layouts are checked when their parsers are compiled,
+        # but a bad layout on the command itself can be caught right away.
+        ArgumentLayout(param.nargs for param in cmd.params
+                       if isinstance(param, click.Argument))
+        parse_cache = None
+        if parse_cache_size is not None or parse_cache_bytes is not None:
+            parse_cache = LRUCache(parse_cache_size, parse_cache_bytes)
+        cache = ParserCache(
+            cmd, parser_kw, timing_hook, parse_cache, decoding)
+        cmd.parse_cache = parse_cache
+        cmd.invoke_line = functools.partial(invoke_line, cmd, cache)
+        cmd.invoke_lines = functools.partial(invoke_lines, cmd, cache)
+        cmd.invoke_block = functools.partial(invoke_block, cmd, cache)
+        cmd.parse_line = functools.partial(parse_line, cmd, cache)
+        if sys.version_info >= (3, 5):
+            from irclick._aio import ainvoke_line
+            cmd.ainvoke_line = functools.partial(ainvoke_line, cmd, cache)
         return cmd
 
     return deco
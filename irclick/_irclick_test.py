@@ -1,11 +1,21 @@
 # Copyright (c) Aaron Gallagher <_@habnab.it>
 # See LICENSE for details.
 
+import gc
+import os
+import subprocess
+import sys
+import threading
+import weakref
+
 import click
 import pytest
-from click.exceptions import BadOptionUsage
+from click.exceptions import BadOptionUsage, NoSuchOption
 
-from irclick import line_command, trailer_argument
+import irclick
+from irclick import LineResult, ParsedLine, line_command, trailer_argument
+from irclick._parser import OptionParser
+from irclick._splut import Splut, SplutStream
 
 
 @pytest.mark.parametrize(('line', 'expected'), [
@@ -180,6 +190,51 @@ def test_varargs(line, expected):
     assert state == expected
 
 
+@pytest.mark.parametrize(('line', 'expected'), [
+    (u'a x y z', {'arg1': u'a', 'arg2': (), 'arg3': u'x',
+                  'arg4': (u'y', u'z')}),
+    (u'a b c x y z', {'arg1': u'a', 'arg2': (u'b', u'c'), 'arg3': u'x',
+                      'arg4': (u'y', u'z')}),
+])
+def test_args_after_varargs(line, expected):
+    @line_command()
+    @click.command()
+    @click.argument('arg1')
+    @click.argument('arg2', nargs=-1)
+    @click.argument('arg3')
+    @click.argument('arg4', nargs=2)
+    def cmd1(**kw):
+        return kw
+
+    assert cmd1.invoke_line(line) == expected
+
+
+@pytest.mark.parametrize('decorators', [
+    [click.argument('arg1', nargs=-1), click.argument('arg2', nargs=-1)],
+    [click.argument('arg1', nargs=-1), trailer_argument('arg2')],
+    [trailer_argument('arg1'), click.argument('arg2')],
+    [click.argument('arg1', nargs=0)],
+])
+def test_invalid_argument_layout(decorators):
+    def cmd1(**kw):
+        pass
+
+    for decorator in reversed(decorators):
+        cmd1 = decorator(cmd1)
+    cmd1 = click.command()(cmd1)
+    with pytest.raises(TypeError):
+        line_command()(cmd1)
+
+    @line_command()
+    @click.group()
+    def group():
+        pass
+
+    group.add_command(cmd1, 'sub')
+    with pytest.raises(TypeError):
+        group.invoke_line(u'sub')
+
+
 @pytest.mark.parametrize(('line', 'expected'), [
     (u'/1 arg1', {'one': u'arg1'}),
     (u'/one arg2', {'one': u'arg2'}),
@@ -209,3 +264,793 @@ def test_alternate_prefix(line, expected):
 
     cmd1.invoke_line(line)
     assert {k: v for k, v in state.items() if v} == expected
+
+
+class CountingOption(click.Option):
+    compiled = 0
+
+    def add_to_parser(self, parser, ctx):
+        CountingOption.compiled += 1
+        return click.Option.add_to_parser(self, parser, ctx)
+
+
+def test_parser_compiled_once():
+    CountingOption.compiled = 0
+    state = []
+
+    @line_command()
+    @click.command()
+    @click.option('-1', '--one', cls=CountingOption)
+    def cmd1(one):
+        state.append(one)
+
+    for line in [u'-1 hey', u'--one hi', u'']:
+        cmd1.invoke_line(line)
+    assert state == [u'hey', u'hi', None]
+    assert CountingOption.compiled == 1
+
+
+def test_cached_parser_keeps_no_context():
+    class Connection(object):
+        pass
+
+    @line_command()
+    @click.group()
+    @click.pass_obj
+    def cmd1(obj):
+        pass
+
+    @cmd1.command()
+    @click.option('-1', '--one')
+    @click.pass_obj
+    def scmd1(obj, one):
+        return one
+
+    conn = Connection()
+    ref = weakref.ref(conn)
+    assert cmd1.invoke_line(u'scmd1 -1 hey', obj=conn) == u'hey'
+    del conn
+    gc.collect()
+    assert ref() is None
+    assert cmd1.invoke_line(u'scmd1 -1 hi', obj=Connection()) == u'hi'
+
+
+def test_subcommand_added_after_invoke():
+    state = []
+
+    @line_command()
+    @click.group()
+    def cmd1():
+        pass
+
+    @cmd1.command()
+    @trailer_argument('trailer')
+    def scmd1(trailer):
+        state.append(('scmd1', trailer))
+
+    cmd1.invoke_line(u'scmd1 hi hello')
+
+    @cmd1.command()
+    @trailer_argument('trailer')
+    def scmd2(trailer):
+        state.append(('scmd2', trailer))
+
+    cmd1.invoke_line(u'scmd2 hello hi')
+    assert state == [('scmd1', u'hi hello'), ('scmd2', u'hello hi')]
+
+
+def test_shared_group_watched_once():
+    @click.group()
+    def shared():
+        pass
+
+    @shared.command()
+    def scmd1():
+        return 'scmd1'
+
+    cmds = []
+    for name in ['cmd1', 'cmd2']:
+        cmd = line_command()(click.Group(name))
+        cmd.add_command(shared)
+        cmds.append(cmd)
+
+    for i in range(10):
+        for cmd in cmds:
+            assert cmd.invoke_line(u'shared scmd1') == 'scmd1'
+            with pytest.raises(click.UsageError):
+                cmd.invoke_line(u'shared nope%d' % (i,))
+
+    depth = 0
+    add_command = shared.add_command
+    while hasattr(add_command, 'func'):
+        depth += 1
+        add_command = add_command.args[0]
+    assert depth == 2
+
+    @shared.command()
+    def scmd2():
+        return 'scmd2'
+
+    assert [cmd.invoke_line(u'shared scmd2') for cmd in cmds] == [
+        'scmd2', 'scmd2']
+
+
+def test_chained_subcommands():
+    state = []
+
+    @line_command()
+    @click.group(chain=True)
+    def cmd1():
+        pass
+
+    @cmd1.command()
+    @click.option('-1', '--one')
+    def scmd1(one):
+        state.append(('scmd1', one))
+        return 1
+
+    @cmd1.command()
+    @click.argument('arg')
+    def scmd2(arg):
+        state.append(('scmd2', arg))
+        return 2
+
+    cmd1.invoke_line(u'scmd1 -1 hey scmd2 hi scmd1')
+    assert state == [('scmd1', u'hey'), ('scmd2', u'hi'), ('scmd1', None)]
+
+
+def test_no_such_subcommand():
+    @line_command()
+    @click.group()
+    def cmd1():
+        pass
+
+    with pytest.raises(click.UsageError):
+        cmd1.invoke_line(u'scmd1')
+
+
+def test_concurrent_invoke_line():
+    make_str = click.core.make_str
+    start = threading.Event()
+    results = []
+
+    @line_command()
+    @click.group()
+    @click.option('-2', '--two/--no-two')
+    def cmd1(two):
+        pass
+
+    @cmd1.command()
+    @click.argument('arg')
+    @trailer_argument('trailer')
+    def scmd1(arg, trailer):
+        assert click.core.make_str is make_str
+        return arg, trailer
+
+    def worker(n):
+        start.wait()
+        for i in range(100):
+            results.append(cmd1.invoke_line(u'-2 scmd1 %d %d trailer' % (n, i)))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    start.set()
+    for t in threads:
+        t.join()
+    assert sorted(results) == sorted(
+        (u'%d' % n, u'%d trailer' % i) for n in range(8) for i in range(100))
+
+
+def test_trailer_splits_lazily():
+    line = u'-1hey arg hi hello there'
+    pulled = []
+
+    def spluts():
+        for splut in Splut.args_of_line(line):
+            pulled.append(splut.string)
+            yield splut
+
+    parser = OptionParser()
+    parser.allow_interspersed_args = False
+    parser.add_option(['-1'], dest='one', obj='one')
+    parser.add_argument(dest='arg', obj='arg')
+    parser.add_argument(dest='trailer', obj='trailer', nargs=-2)
+    opts, args, order = parser.parse_args(SplutStream(spluts()))
+    assert opts == {'one': u'hey', 'arg': u'arg', 'trailer': (u'hi hello there',)}
+    assert pulled == [u'-1hey', u'arg', u'hi']
+    assert not args
+
+
+def test_options_first_splits_lazily():
+    line = u'-1hey arg hi -1 hello there'
+    pulled = []
+
+    def spluts():
+        for splut in Splut.args_of_line(line):
+            pulled.append(splut.string)
+            yield splut
+
+    parser = OptionParser(options_first=True)
+    parser.add_option(['-1'], dest='one', obj='one')
+    parser.add_argument(dest='arg', obj='arg')
+    parser.add_argument(dest='trailer', obj='trailer', nargs=-2)
+    assert parser.allow_interspersed_args is False
+    opts, args, order = parser.parse_args(SplutStream(spluts()))
+    assert opts == {
+        'one': u'hey', 'arg': u'arg', 'trailer': (u'hi -1 hello there',)}
+    assert pulled == [u'-1hey', u'arg', u'hi']
+    assert not args
+
+
+@pytest.mark.parametrize(('options_first', 'expected'), [
+    (False, (u'there', u'arg', u'hi -1 there')),
+    (True, (u'hey', u'arg', u'hi -1 there')),
+])
+def test_options_first(options_first, expected):
+    @line_command(options_first=options_first)
+    @click.command()
+    @click.option('-1', '--one')
+    @click.argument('arg')
+    @trailer_argument('trailer')
+    def cmd1(one, arg, trailer):
+        return one, arg, trailer
+
+    assert cmd1.invoke_line(u'-1 hey arg hi -1 there') == expected
+
+
+IMPORT_SCRIPT = '''
+import subprocess, sys, time
+
+spawned = []
+_Popen = subprocess.Popen
+class Popen(_Popen):
+    def __init__(self, *a, **kw):
+        spawned.append(a)
+        _Popen.__init__(self, *a, **kw)
+subprocess.Popen = Popen
+
+start = time.time()
+import irclick
+elapsed = time.time() - start
+assert not spawned, spawned
+assert '__version__' not in vars(irclick)
+assert irclick.__version__
+print(elapsed)
+'''
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='needs module __getattr__')
+def test_import_spawns_nothing():
+    package_dir = os.path.dirname(os.path.dirname(irclick.__file__))
+    env = dict(os.environ, PYTHONPATH=package_dir)
+    output = subprocess.check_output(
+        [sys.executable, '-c', IMPORT_SCRIPT], env=env)
+    assert float(output) < 1
+
+
+@pytest.mark.parametrize(('line', 'expected'), [
+    (u'--on hey', {'one': u'hey'}),
+    (u'--one hey', {'one': u'hey'}),
+    (u'--tw', {'two': True}),
+    (u'--no hey', NoSuchOption),
+    (u'--o hey', NoSuchOption),
+    (u'--x', NoSuchOption),
+    (u'-1 a', {'one': u'a'}),
+    (u'-1x', {'onex': True}),
+])
+def test_abbreviated_options(line, expected):
+    state = {}
+
+    @line_command(abbreviate_options=True)
+    @click.command()
+    @click.option('-1', '--one')
+    @click.option('-1x', 'onex', is_flag=True)
+    @click.option('--other')
+    @click.option('-2', '--two/--no-two')
+    @click.option('--nothing', is_flag=True)
+    def cmd1(one, onex, other, two, nothing):
+        state.update(one=one, onex=onex, other=other, two=two,
+                     nothing=nothing)
+
+    if isinstance(expected, type):
+        with pytest.raises(expected):
+            cmd1.invoke_line(line)
+    else:
+        cmd1.invoke_line(line)
+        assert {k: v for k, v in state.items() if v} == expected
+
+
+@pytest.mark.parametrize(('line', 'possibilities'), [
+    (u'--o hey', ['--one', '--other']),
+    (u'--on hey', ['--one']),
+    (u'--x', []),
+])
+def test_option_possibilities(line, possibilities):
+    @line_command()
+    @click.command()
+    @click.option('-1', '--one')
+    @click.option('--other')
+    def cmd1(one, other):
+        pass
+
+    with pytest.raises(NoSuchOption) as excinfo:
+        cmd1.invoke_line(line)
+    assert sorted(excinfo.value.possibilities) == possibilities
+
+
+def test_invoke_lines():
+    @line_command()
+    @click.command()
+    @click.option('-1', '--one', type=int)
+    @trailer_argument('trailer')
+    def cmd1(one, trailer):
+        return one, trailer
+
+    lines = [u'-1 2 hi', u'-1 x hi', u'--two', u'--help', u'hello there']
+    results = cmd1.invoke_lines(iter(lines))
+    first = next(results)
+    assert first == LineResult(u'-1 2 hi', (2, u'hi'), None)
+    rest = list(results)
+    assert [r.line for r in rest] == lines[1:]
+    assert isinstance(rest[0].error, click.BadParameter)
+    assert isinstance(rest[1].error, NoSuchOption)
+    assert isinstance(rest[2].error, SystemExit)
+    assert rest[3] == LineResult(u'hello there', (None, u'hello there'), None)
+
+
+def test_parse_line_subcommand():
+    state = []
+
+    @line_command()
+    @click.group()
+    @click.option('-2', '--two/--no-two')
+    def cmd1(two):
+        state.append(two)
+
+    @cmd1.command()
+    @click.option('-1', '--one', type=int)
+    @trailer_argument('trailer')
+    def scmd1(one, trailer):
+        state.append(trailer)
+
+    parsed = cmd1.parse_line(u'-2 scmd1 -1 5 hi hello')
+    assert parsed == ParsedLine(
+        ('cmd1', 'scmd1'),
+        ({'two': True}, {'one': u'5', 'trailer': (u'hi hello',)}),
+        [])
+    assert not state
+
+    with pytest.raises(click.UsageError):
+        cmd1.parse_line(u'-2 scmd2')
+    with pytest.raises(click.UsageError):
+        cmd1.parse_line(u'-2')
+
+
+def test_parse_line_chain():
+    @line_command()
+    @click.group(chain=True)
+    def cmd1():
+        pass
+
+    @cmd1.command()
+    @click.option('-1', '--one')
+    def scmd1(one):
+        pass
+
+    @cmd1.command()
+    @click.argument('arg')
+    def scmd2(arg):
+        pass
+
+    parsed = cmd1.parse_line(u'scmd1 -1 hey scmd2 hi scmd1')
+    assert parsed.path == ('cmd1', 'scmd1', 'scmd2', 'scmd1')
+    assert parsed.values == ({}, {'one': u'hey'}, {'arg': u'hi'}, {})
+
+
+def test_parse_line_extra_args():
+    @line_command()
+    @click.command()
+    @click.argument('arg')
+    def cmd1(arg):
+        pass
+
+    assert cmd1.parse_line(u'hi') == ParsedLine(('cmd1',), ({'arg': u'hi'},), [])
+    with pytest.raises(click.UsageError):
+        cmd1.parse_line(u'hi hello')
+
+
+def test_nested_groups():
+    state = []
+
+    @line_command()
+    @click.group()
+    def cmd1():
+        pass
+
+    @cmd1.group()
+    def grp():
+        pass
+
+    @grp.command()
+    @trailer_argument('trailer')
+    def scmd1(trailer):
+        state.append(('scmd1', trailer))
+
+    cmd1.invoke_line(u'grp scmd1 hi hello')
+
+    @grp.command()
+    @trailer_argument('trailer')
+    def scmd2(trailer):
+        state.append(('scmd2', trailer))
+
+    cmd1.invoke_line(u'grp scmd2 hello hi')
+    assert state == [('scmd1', u'hi hello'), ('scmd2', u'hello hi')]
+    with pytest.raises(click.UsageError):
+        cmd1.invoke_line(u'scmd1 hi')
+
+
+class AliasedGroup(click.Group):
+    def get_command(self, ctx, cmd_name):
+        return click.Group.get_command(self, ctx, cmd_name.rstrip('!'))
+
+
+def test_overridden_get_command():
+    state = []
+
+    @line_command()
+    @click.group(cls=AliasedGroup)
+    def cmd1():
+        pass
+
+    @cmd1.command()
+    @trailer_argument('trailer')
+    def scmd1(trailer):
+        state.append(trailer)
+
+    cmd1.invoke_line(u'scmd1! hi hello')
+    assert state == [u'hi hello']
+
+
+class PrefixGroup(click.Group):
+    def resolve_command(self, ctx, args):
+        matches = [name for name in self.list_commands(ctx)
+                   if name.startswith(args[0])]
+        if len(matches) != 1:
+            ctx.fail('%s is ambiguous' % (args[0],))
+        return matches[0], self.get_command(ctx, matches[0]), args[1:]
+
+
+def test_overridden_resolve_command():
+    @line_command()
+    @click.group(cls=PrefixGroup)
+    def cmd1():
+        pass
+
+    @cmd1.command()
+    @trailer_argument('trailer')
+    def weather(trailer):
+        return trailer
+
+    @cmd1.command()
+    def whois():
+        pass
+
+    assert cmd1.invoke_line(u'wea london  town') == u'london  town'
+    assert cmd1.parse_line(u'wea london').path == ('cmd1', 'weather')
+    with pytest.raises(click.UsageError):
+        cmd1.invoke_line(u'w london')
+    with pytest.raises(click.UsageError):
+        cmd1.parse_line(u'w london')
+
+
+class DefaultGroup(click.Group):
+    """Like click-default-group's, which runs a default subcommand when the
+    line doesn't name one.
+    """
+
+    def __init__(self, *a, **kw):
+        self.default_cmd_name = kw.pop('default')
+        click.Group.__init__(self, *a, **kw)
+
+    def parse_args(self, ctx, args):
+        if not args:
+            args.insert(0, self.default_cmd_name)
+        return click.Group.parse_args(self, ctx, args)
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands:
+            ctx.arg0 = cmd_name
+            cmd_name = self.default_cmd_name
+        return click.Group.get_command(self, ctx, cmd_name)
+
+    def resolve_command(self, ctx, args):
+        cmd_name, cmd, args = click.Group.resolve_command(self, ctx, args)
+        if hasattr(ctx, 'arg0'):
+            args.insert(0, ctx.arg0)
+        return cmd_name, cmd, args
+
+
+def test_overridden_parse_args():
+    @line_command()
+    @click.group(cls=DefaultGroup, default='echo')
+    def cmd1():
+        pass
+
+    @cmd1.command()
+    @click.argument('words', nargs=-1)
+    def echo(words):
+        return 'echo', words
+
+    @cmd1.command()
+    @trailer_argument('trailer')
+    def say(trailer):
+        return 'say', trailer
+
+    assert cmd1.invoke_line(u'') == ('echo', ())
+    assert cmd1.invoke_line(u'hi there') == ('echo', (u'hi', u'there'))
+    assert cmd1.invoke_line(u'say hi  there') == ('say', u'hi  there')
+
+
+class InvokingGroup(click.Group):
+    def invoke(self, ctx):
+        args = ctx.protected_args + ctx.args
+        ctx.obj.append([click.utils.make_str(arg) for arg in args])
+        return click.Group.invoke(self, ctx)
+
+
+class ContextCommand(click.Command):
+    def make_context(self, info_name, args, parent=None, **extra):
+        ctx = click.Command.make_context(
+            self, info_name, args, parent=parent, **extra)
+        ctx.obj.append(info_name)
+        return ctx
+
+
+def test_overridden_invoke_and_make_context():
+    @line_command()
+    @click.group(cls=InvokingGroup)
+    @click.option('-2', '--two/--no-two')
+    def cmd1(two):
+        pass
+
+    @cmd1.command(cls=ContextCommand)
+    @click.option('-1', '--one')
+    @trailer_argument('trailer')
+    def scmd1(one, trailer):
+        return one, trailer
+
+    @cmd1.group(cls=InvokingGroup)
+    def scmd2():
+        pass
+
+    @scmd2.command()
+    @trailer_argument('trailer')
+    def sscmd1(trailer):
+        return trailer
+
+    obj = []
+    assert cmd1.invoke_line(u'-2 scmd1 -1x hi  there', obj=obj) == (
+        u'x', u'hi  there')
+    assert cmd1.invoke_line(u'scmd2 sscmd1 a  b', obj=obj) == u'a  b'
+    assert obj == [
+        ['scmd1', '-1x', 'hi', 'there'], 'scmd1',
+        ['scmd2', 'sscmd1', 'a', 'b'], ['sscmd1', 'a', 'b']]
+
+    @scmd2.command()
+    @trailer_argument('trailer')
+    def sscmd2(trailer):
+        return trailer
+
+    assert cmd1.invoke_line(u'scmd2 sscmd2 c  d', obj=[]) == u'c  d'
+
+
+class LazyGroup(click.MultiCommand):
+    def __init__(self, *a, **kw):
+        click.MultiCommand.__init__(self, *a, **kw)
+        self.loaded = []
+
+    def list_commands(self, ctx):
+        raise AssertionError('subcommands were listed')
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in ('plugin1', 'plugin2'):
+            return None
+        self.loaded.append(cmd_name)
+
+        @click.command(cmd_name)
+        @trailer_argument('trailer')
+        def plugin(trailer):
+            return cmd_name, trailer
+        return plugin
+
+
+def test_lazy_subcommands():
+    cmd1 = line_command()(LazyGroup())
+    assert cmd1.invoke_line(u'plugin1 hi') == ('plugin1', u'hi')
+    assert cmd1.invoke_line(u'plugin1 hello') == ('plugin1', u'hello')
+    assert cmd1.parse_line(u'plugin1 hey').path == (None, 'plugin1')
+    assert cmd1.loaded == ['plugin1']
+    assert cmd1.invoke_line(u'plugin2 hi') == ('plugin2', u'hi')
+    assert cmd1.loaded == ['plugin1', 'plugin2']
+    with pytest.raises(click.UsageError):
+        cmd1.invoke_line(u'plugin3 hi')
+
+
+def test_timing_hook():
+    timings = []
+
+    def hook(stage, cmd, seconds):
+        assert seconds >= 0
+        timings.append((stage, cmd.name))
+
+    @line_command(timing_hook=hook)
+    @click.group()
+    @click.option('-2', '--two/--no-two')
+    def cmd1(two):
+        pass
+
+    @cmd1.command()
+    @trailer_argument('trailer')
+    def scmd1(trailer):
+        pass
+
+    cmd1.invoke_line(u'-2 scmd1 hi hello')
+    assert timings == [
+        ('context', 'cmd1'), ('parse', 'cmd1'), ('params', 'cmd1'),
+        ('callback', 'cmd1'),
+        ('context', 'scmd1'), ('parse', 'scmd1'), ('params', 'scmd1'),
+        ('callback', 'scmd1'),
+    ]
+    del timings[:]
+    cmd1.parse_line(u'-2 scmd1 hi hello')
+    assert timings == [('parse', 'cmd1'), ('parse', 'scmd1')]
+
+
+def test_parse_cache():
+    state = []
+
+    @line_command(parse_cache_size=2)
+    @click.group()
+    @click.option('-2', '--two/--no-two')
+    def cmd1(two):
+        state.append(two)
+
+    @cmd1.command()
+    @click.option('-1', '--one', type=int)
+    @trailer_argument('trailer')
+    def scmd1(one, trailer):
+        state.append((one, trailer))
+
+    for line in [u'-2 scmd1 -1 3 hi', u'-2 scmd1 -1 3 hi', u'scmd1 hey',
+                 u'-2 scmd1 -1 3 hi', u'-2 scmd1 -1 4 hi', u'scmd1 hey']:
+        cmd1.invoke_line(line)
+    assert state == [
+        True, (3, u'hi'), True, (3, u'hi'), False, (None, u'hey'),
+        True, (3, u'hi'), True, (4, u'hi'), False, (None, u'hey')]
+    info = cmd1.parse_cache.info()
+    assert (info.hits, info.misses, info.currsize) == (2, 4, 2)
+
+    with pytest.raises(click.BadParameter):
+        cmd1.invoke_line(u'scmd1 -1 x')
+    with pytest.raises(click.BadParameter):
+        cmd1.invoke_line(u'scmd1 -1 x')
+    assert cmd1.parse_cache.info().hits == 2
+
+
+def test_parse_cache_settings():
+    @line_command(parse_cache_size=2)
+    @click.command()
+    @click.argument('arg')
+    @click.pass_obj
+    def cmd1(obj, arg):
+        return obj, arg
+
+    assert cmd1.invoke_line(u'hi', obj=1) == (1, u'hi')
+    assert cmd1.invoke_line(u'hi', obj=2) == (2, u'hi')
+    assert cmd1.parse_cache.info().hits == 1
+    assert cmd1.invoke_line(u'hi', obj=3, resilient_parsing=True) == (
+        3, u'hi')
+    assert cmd1.parse_cache.info().hits == 1
+
+
+def test_parse_cache_bytes():
+    @line_command(parse_cache_bytes=2000)
+    @click.command()
+    @trailer_argument('trailer')
+    def cmd1(trailer):
+        return trailer
+
+    for i in range(50):
+        assert cmd1.invoke_line(u'line %d' % (i,)) == u'line %d' % (i,)
+    info = cmd1.parse_cache.info()
+    assert 0 < info.currsize < 50
+    assert info.currbytes <= 2000
+    assert cmd1.invoke_line(u'line 49') == u'line 49'
+    assert cmd1.parse_cache.info().hits == 1
+
+
+@pytest.mark.parametrize(('prefix', 'rest'), [
+    (u'@tags=' + u'x' * 5000 + u' PRIVMSG :', u'-2 scmd1 a b  c'),
+    (b'@tags=' + b'x' * 5000 + b' PRIVMSG :', b'-2 scmd1 a b  c'),
+], ids=['text', 'bytes'])
+def test_parse_cache_keeps_only_key(prefix, rest):
+    @line_command(parse_cache_size=4)
+    @click.group()
+    @click.option('-2', '--two/--no-two')
+    def cmd1(two):
+        pass
+
+    @cmd1.command()
+    @click.argument('arg')
+    @trailer_argument('trailer')
+    def scmd1(arg, trailer):
+        return arg, trailer
+
+    line = prefix + rest
+    for i in range(2):
+        assert cmd1.invoke_line(line, len(prefix)) == (u'a', u'b  c')
+    (_, words, _), _ = cmd1.parse_cache.get(rest)
+    assert [getattr(word.line, 'buffer', word.line) for word in words] == [
+        rest] * 4
+    assert cmd1.parse_cache.info().currbytes < 5000
+
+
+def test_no_parse_cache():
+    @line_command()
+    @click.command()
+    def cmd1():
+        pass
+
+    assert cmd1.parse_cache is None
+
+
+@pytest.mark.parametrize(('line', 'expected'), [
+    (b'-1 hey hi hello', {'one': u'hey', 'trailer': u'hi hello'}),
+    (bytearray(b'-1hey hi hello'), {'one': u'hey', 'trailer': u'hi hello'}),
+    (memoryview(b'--one=h\xc3\xa9 hi  h\xc3\xa9llo'),
+     {'one': u'h\xe9', 'trailer': u'hi  h\xe9llo'}),
+    (b'-1h\xc3\xa9 \xe9t\xe9', {'one': u'h\xe9', 'trailer': u'\xe9t\xe9'}),
+    (b'-1\xc3\xa9\xc3\xa9 hi', {'one': u'\xe9\xe9', 'trailer': u'hi'}),
+    (b'hi\xc2\xa0there', {'trailer': u'hi\xa0there'}),
+])
+def test_bytes_lines(line, expected):
+    state = {}
+
+    @line_command()
+    @click.command()
+    @click.option('-1', '--one')
+    @trailer_argument('trailer')
+    def cmd1(one, trailer):
+        state.update(one=one, trailer=trailer)
+
+    cmd1.invoke_line(line)
+    assert {k: v for k, v in state.items() if v} == expected
+
+
+def test_bytes_lines_decoding():
+    @line_command(fallback_encoding=None, errors='replace')
+    @click.command()
+    @trailer_argument('trailer')
+    def cmd1(trailer):
+        return trailer
+
+    assert cmd1.invoke_line(b'h\xe9llo') == u'h\ufffdllo'
+
+    @line_command(fallback_encoding=None)
+    @click.command()
+    @trailer_argument('trailer')
+    def cmd2(trailer):
+        return trailer
+
+    with pytest.raises(UnicodeDecodeError):
+        cmd2.invoke_line(b'h\xe9llo')
+
+
+def test_bytes_words_decoded_lazily():
+    words = Splut.args_of_line(b'one \xff two', fallback_encoding=None)
+    assert next(words).string == u'one'
+    bad = next(words)
+    assert next(words).string == u'two'
+    with pytest.raises(UnicodeDecodeError):
+        bad.string
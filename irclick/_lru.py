@@ -0,0 +1,72 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+import collections
+import threading
+
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ['hits', 'misses', 'maxsize', 'currsize', 'maxbytes',
+                  'currbytes'])
+
+
+class LRUCache(object):
+    """A thread-safe mapping which evicts its least recently used entries
+    when it has more than `maxsize` of them, or when the sizes of its
+    entries add up to more than `maxbytes`.  Either limit can be `None` for
+    no limit.
+
+    The size of an entry is whatever was passed to :meth:`put` for it; it's
+    up to the caller to decide how to measure it.
+    """
+
+    def __init__(self, maxsize=128, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=0):
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = value, size
+            self._bytes += size
+            while self._entries and (
+                    (self.maxsize is not None
+                     and len(self._entries) > self.maxsize)
+                    or (self.maxbytes is not None
+                        and self._bytes > self.maxbytes)):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, self.maxsize, len(self._entries),
+                self.maxbytes, self._bytes)
+
+    def __len__(self):
+        return len(self._entries)
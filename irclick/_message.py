@@ -0,0 +1,176 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+from irclick._splut import ByteLine, is_bytes
+
+
+_TAG_ESCAPES = {
+    u':': u';',
+    u's': u' ',
+    u'\\': u'\\',
+    u'r': u'\r',
+    u'n': u'\n',
+}
+
+
+def unescape_tag_value(value):
+    if u'\\' not in value:
+        return value
+    ret = []
+    chars = iter(value)
+    for c in chars:
+        if c == u'\\':
+            c = next(chars, u'')
+            c = _TAG_ESCAPES.get(c, c)
+        ret.append(c)
+    return u''.join(ret)
+
+
+def parse_tags(raw):
+    """Parses IRCv3 message tags.  A tag without a value gets an empty one,
+    the same as a tag with an empty value.
+    """
+    tags = {}
+    for tag in raw.split(u';'):
+        if not tag:
+            continue
+        key, _, value = tag.partition(u'=')
+        tags[key] = unescape_tag_value(value)
+    return tags
+
+
+class Message(object):
+    """An IRC message, parsed in place.
+
+    The tags, prefix, command and middle parameters are sliced out of the
+    line when it's parsed; they're all small.  The trailing parameter,
+    which is where the text of a ``PRIVMSG`` goes, is only kept as the
+    offsets `trailing_start` and `end` into `line`, so it can be handed to
+    a line command with :meth:`invoke_line` without ever being copied.
+    `final_start` is the offset of the final parameter, which is the
+    trailing one if there is one, and otherwise the last middle one.
+
+    Messages of bytes have their parts decoded according to the `decoding`
+    arguments of :class:`ByteLine`, and so does the trailing parameter
+    when it's used.
+    """
+
+    __slots__ = ('line', 'tags', 'prefix', 'command', 'middle',
+                 'trailing_start', 'final_start', 'end', '_text')
+
+    def __init__(self, line, tags, prefix, command, middle, trailing_start,
+                 final_start, end, text):
+        self.line = line
+        self.tags = tags
+        self.prefix = prefix
+        self.command = command
+        self.middle = middle
+        self.trailing_start = trailing_start
+        self.final_start = final_start
+        self.end = end
+        self._text = text
+
+    @classmethod
+    def parse(cls, line, pos=0, endpos=None, **decoding):
+        """Parses the message in `line` from `pos` to `endpos`.  A trailing
+        CR LF, or either of them, is ignored.
+
+        `line` can be text or bytes, including a :class:`bytearray` or
+        :class:`mmap.mmap`, but not a :class:`memoryview`.  Raises
+        :exc:`ValueError` if there's no command.
+        """
+        if endpos is None:
+            endpos = len(line)
+        if is_bytes(line):
+            text = ByteLine(line, endpos, **decoding)
+            space, colon, at, crlf = b' ', b':', b'@', b'\r\n'
+        else:
+            text = line
+            space, colon, at, crlf = u' ', u':', u'@', u'\r\n'
+        line_endings = crlf[:1], crlf[1:]
+        while endpos > pos and line[endpos - 1:endpos] in line_endings:
+            endpos -= 1
+
+        # Everything here is done with find and one-character slices, since
+        # that's all an mmap supports.
+        def word_end(start):
+            i = line.find(space, start, endpos)
+            return endpos if i < 0 else i
+
+        def skip_spaces(i):
+            while i < endpos and line[i:i + 1] == space:
+                i += 1
+            return i
+
+        tags = {}
+        if line[pos:pos + 1] == at:
+            i = word_end(pos)
+            tags = parse_tags(text[pos + 1:i])
+            pos = skip_spaces(i)
+
+        prefix = None
+        if line[pos:pos + 1] == colon:
+            i = word_end(pos)
+            prefix = text[pos + 1:i]
+            pos = skip_spaces(i)
+
+        i = word_end(pos)
+        if i == pos:
+            raise ValueError('no command in message')
+        command = text[pos:i].upper()
+        pos = skip_spaces(i)
+
+        middle = []
+        trailing_start = final_start = None
+        while pos < endpos:
+            if line[pos:pos + 1] == colon:
+                trailing_start = final_start = pos + 1
+                break
+            final_start = pos
+            i = word_end(pos)
+            middle.append(text[pos:i])
+            pos = skip_spaces(i)
+
+        return cls(line, tags, prefix, command, middle, trailing_start,
+                   final_start, endpos, text)
+
+    @property
+    def trailing(self):
+        """The trailing parameter, copied out of the line, or `None` if the
+        message doesn't have one.
+        """
+        if self.trailing_start is None:
+            return None
+        return self._text[self.trailing_start:self.end]
+
+    @property
+    def params(self):
+        """All of the parameters, including the trailing one, as a list."""
+        params = list(self.middle)
+        if self.trailing_start is not None:
+            params.append(self.trailing)
+        return params
+
+    def invoke_line(self, cmd, **kw):
+        """Invokes the line command `cmd` on the final parameter, which is
+        tokenized in place inside the message's line.  As in RFC 1459, that
+        doesn't need a colon in front of it to be the final parameter.
+        """
+        return cmd.invoke_line(self.line, **self._line_kw(kw))
+
+    def parse_line(self, cmd, **kw):
+        """Like :meth:`invoke_line`, but with ``cmd.parse_line``."""
+        return cmd.parse_line(self.line, **self._line_kw(kw))
+
+    def _line_kw(self, kw):
+        if self.final_start is None:
+            start = self.end
+        else:
+            start = self.final_start
+        kw['pos'] = start
+        kw['endpos'] = self.end
+        return kw
+
+    def __repr__(self):
+        return '<Message tags=%r prefix=%r command=%r params=%r>' % (
+            self.tags, self.prefix, self.command, self.params)
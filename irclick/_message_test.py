@@ -0,0 +1,81 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+import click
+import pytest
+
+from irclick import Message, line_command, trailer_argument
+
+
+@pytest.mark.parametrize(('line', 'tags', 'prefix', 'command', 'params'), [
+    (u'PING :irc.example.net', {}, None, u'PING', [u'irc.example.net']),
+    (u':nick!user@host PRIVMSG #chan :!cmd -1 hi  there\r\n', {},
+     u'nick!user@host', u'PRIVMSG', [u'#chan', u'!cmd -1 hi  there']),
+    (u'@id=123;+draft/x=a\\sb\\:c\\\\;flag;empty= :n PRIVMSG #c :hi',
+     {u'id': u'123', u'+draft/x': u'a b;c\\', u'flag': u'', u'empty': u''},
+     u'n', u'PRIVMSG', [u'#c', u'hi']),
+    (u'mode  #chan   +o nick', {}, None, u'MODE', [u'#chan', u'+o', u'nick']),
+    (u'PRIVMSG #chan :', {}, None, u'PRIVMSG', [u'#chan', u'']),
+    (u'PRIVMSG #chan ::)', {}, None, u'PRIVMSG', [u'#chan', u':)']),
+    (b':n\xc3\xa9ck PRIVMSG #chan :h\xc3\xa9llo\r\n', {}, u'n\xe9ck',
+     u'PRIVMSG', [u'#chan', u'h\xe9llo']),
+    (bytearray(b'@a=b JOIN #chan\n'), {u'a': u'b'}, None, u'JOIN',
+     [u'#chan']),
+])
+def test_parse(line, tags, prefix, command, params):
+    message = Message.parse(line)
+    assert message.tags == tags
+    assert message.prefix == prefix
+    assert message.command == command
+    assert message.params == params
+
+
+@pytest.mark.parametrize('line', [u'', u'\r\n', u':prefix', u'@tags  '])
+def test_parse_no_command(line):
+    with pytest.raises(ValueError):
+        Message.parse(line)
+
+
+def test_parse_range():
+    buffer = b'PING :one\r\nPRIVMSG #chan :two words\r\nPING :three\r\n'
+    start = buffer.index(b'PRIVMSG')
+    end = buffer.index(b'\r\n', start) + 2
+    message = Message.parse(buffer, start, end)
+    assert message.command == u'PRIVMSG'
+    assert message.params == [u'#chan', u'two words']
+    assert message.line is buffer
+
+
+@pytest.mark.parametrize('line', [
+    u':nick!user@host PRIVMSG #chan :-1 hey hi  there\r\n',
+    b':nick!user@host PRIVMSG #chan :-1 hey hi  there\r\n',
+])
+def test_invoke_line_on_trailing(line):
+    @line_command()
+    @click.command()
+    @click.option('-1', '--one')
+    @trailer_argument('trailer')
+    def cmd1(one, trailer):
+        return one, trailer
+
+    message = Message.parse(line)
+    assert message.invoke_line(cmd1) == (u'hey', u'hi  there')
+    assert message.parse_line(cmd1).values == (
+        {'one': u'hey', 'trailer': (u'hi  there',)},)
+
+
+def test_invoke_line_without_trailing():
+    @line_command()
+    @click.command()
+    @trailer_argument('trailer')
+    def cmd1(trailer):
+        return trailer
+
+    message = Message.parse(u':n!u@h PRIVMSG #chan !help  me')
+    assert message.params == [u'#chan', u'!help', u'me']
+    assert message.invoke_line(cmd1) == u'me'
+    message = Message.parse(u':n!u@h PRIVMSG #chan !help')
+    assert message.params == [u'#chan', u'!help']
+    assert message.invoke_line(cmd1) == u'!help'
+    assert message.parse_line(cmd1).values == ({'trailer': (u'!help',)},)
+    assert Message.parse(u'PING').invoke_line(cmd1) == u''
@@ -16,44 +16,72 @@
     and might cause us issues.
 """
 
+import copy
+from collections import deque
+
 from click.exceptions import UsageError, NoSuchOption, BadOptionUsage
 from click.parser import Argument, Option, normalize_opt
 
-from irclick._splut import Splut
-
+from irclick._splut import Splut, SplutStream
 
-def _unpack_args(args, argspecs):
-    """Given an iterable of arguments and an iterable of nargs specifications,
-    it returns a tuple with all the unpacked arguments at the first index
-    and all remaining arguments as the second.
 
-    The nargs specification is the number of arguments that should be consumed
-    or `-1` to indicate that this position should eat up all the remainders.
+class ArgumentLayout(object):
+    """The positional arguments of a parser, laid out once when the parser
+    is built instead of every time a line is parsed.
 
-    Missing items are filled with `None`.
+    Every argument's `nargs` is the number of words it takes, or `-1` to
+    take all of the remaining words, or `-2` to take the rest of the line
+    as a single trailer.  At most one argument can do either; the fixed
+    arguments after a `-1` are taken from the end of the line, and nothing
+    can come after a trailer.  Raises :exc:`TypeError` for layouts which
+    break those rules.
     """
-    nargs_spec = [x.nargs for x in reversed(argspecs)]
-    rv = []
-    star_consumed = False
-
-    while nargs_spec:
-        nargs = nargs_spec.pop()
-
-        if nargs < 0:
-            if star_consumed:
-                raise RuntimeError('star')
-            star_consumed = True
-
-        if nargs >= 1:
-            rv.append(args.pop_nargs(nargs))
-        elif nargs == -1:
-            rv.append(tuple(args.pop_rest()))
-        elif nargs == -2:
-            rv.append((args.pop_trailer(),))
+
+    __slots__ = ('before', 'star', 'after')
+
+    def __init__(self, nargs=()):
+        #: The counts of the arguments before the star or trailer, if any.
+        self.before = []
+        #: `-1`, `-2` or `None`.
+        self.star = None
+        #: The counts of the arguments after the star.
+        self.after = []
+        for n in nargs:
+            self.add(n)
+
+    def add(self, n):
+        if n >= 1:
+            if self.star == -2:
+                raise TypeError('no arguments can come after a trailer')
+            (self.before if self.star is None else self.after).append(n)
+        elif n in (-1, -2):
+            if self.star is not None:
+                raise TypeError(
+                    'only one argument can take a variable number of words')
+            if n == -2 and self.after:
+                raise TypeError('no arguments can come after a trailer')
+            self.star = n
         else:
-            raise RuntimeError(nargs)
+            raise TypeError('invalid nargs %r' % (n,))
 
-    return tuple(rv), list(args.remainder())
+    def unpack(self, state):
+        """Returns a tuple of the value of each argument, popped from
+        `state`, and the words left over.
+        """
+        rv = [state.pop_nargs(n) for n in self.before]
+        if self.star == -2:
+            rv.append((state.pop_trailer(),))
+        elif self.star == -1:
+            rest = state.pop_rest()
+            split = len(rest) - sum(self.after)
+            if split < 0:
+                raise RuntimeError(len(rest), self.after)
+            rv.append(tuple(rest[:split]))
+            for n in self.after:
+                value = tuple(rest[split:split + n])
+                rv.append(value[0] if n == 1 else value)
+                split += n
+        return tuple(rv), state.remainder()
 
 
 class ParsingState(object):
@@ -62,25 +90,23 @@ class ParsingState(object):
         self.opts = {}
         self.order = []
         self._consuming_largs = False
-        self._largs = []
-        self._rargs = list(rargs)
+        self._largs = deque()
+        self._rargs = SplutStream.ensure(rargs)
 
     def push_left(self, *args):
         self._largs.extend(Splut.ensure(x) for x in args)
 
     def push_right(self, *args):
-        self._rargs[:0] = (Splut.ensure(x) for x in args)
+        self._rargs.push(*(Splut.ensure(x) for x in args))
 
     def shift_largs(self):
         self._consuming_largs = True
 
     def pop_arg(self):
         if self._consuming_largs and self._largs:
-            return self._largs.pop(0)
-        elif self._rargs:
-            return self._rargs.pop(0)
+            return self._largs.popleft()
         else:
-            return None
+            return next(self._rargs, None)
 
     def _pop_args(self, n):
         for i in range(n):
@@ -96,7 +122,14 @@ class ParsingState(object):
         return ret
 
     def remainder(self):
-        return iter(self.pop_arg, None)
+        """Returns the unconsumed arguments as a :class:`SplutStream`, which
+        hasn't split any more of the line than parsing already has.
+        """
+        rest = self._rargs
+        if self._consuming_largs:
+            rest.push(*self._largs)
+            self._largs.clear()
+        return rest
 
     def pop_rest(self):
         return [s.string for s in self.remainder()]
@@ -106,11 +139,86 @@ class ParsingState(object):
         if arg is None:
             return u''
         else:
-            self._largs = []
-            self._rargs = []
+            self._largs.clear()
+            self._rargs.clear()
             return arg.trailer
 
 
+class _OptionNode(object):
+    __slots__ = ('children', 'option', 'is_long', 'long_options')
+
+    def __init__(self):
+        self.children = {}
+        self.option = None
+        self.is_long = False
+        #: Every ``(name, option)`` pair for the long options whose names
+        #: start with the prefix leading to this node.
+        self.long_options = []
+
+
+class OptionTrie(object):
+    """A prefix tree of every option name a parser knows about.
+
+    Each node also remembers the long options whose names pass through it,
+    so finding an option, the long options starting with some prefix, or the
+    one long option a prefix abbreviates are all a single walk down the tree
+    proportional to the length of the prefix.
+    """
+
+    def __init__(self):
+        self._root = _OptionNode()
+
+    def add(self, name, option, is_long):
+        node = self._root
+        nodes = [node]
+        for ch in name:
+            child = node.children.get(ch)
+            if child is None:
+                child = node.children[ch] = _OptionNode()
+            node = child
+            nodes.append(node)
+        if node.option is not None and node.is_long:
+            for n in nodes:
+                n.long_options = [
+                    pair for pair in n.long_options if pair[0] != name]
+        node.option = option
+        node.is_long = is_long
+        if is_long:
+            for n in nodes:
+                n.long_options.append((name, option))
+
+    def walk(self, name):
+        """Returns the node `name` leads to, or `None` if no option name
+        starts with `name`.
+        """
+        node = self._root
+        for ch in name:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def long_option(self, name, abbreviate=False):
+        """Returns ``(option, possibilities)`` for the long option named
+        `name`.  If there's no such option, `option` is `None` and
+        `possibilities` are the names of the long options starting with
+        `name`.  With `abbreviate`, a prefix of exactly one long option's
+        name finds that option, unless it's also the name of a short option,
+        which always wins.
+        """
+        node = self.walk(name)
+        if node is None:
+            return None, []
+        elif node.option is not None and node.is_long:
+            return node.option, None
+        elif (abbreviate and node.option is None
+              and len(node.long_options) == 1):
+            [(_, option)] = node.long_options
+            return option, None
+        else:
+            return None, [n for n, _ in node.long_options]
+
+
 class OptionParser(object):
     """The option parser is an internal class that is ultimately used to
     parse options and arguments.  It's modelled after optparse and brings
@@ -123,9 +231,20 @@ class OptionParser(object):
 
     :param ctx: optionally the :class:`~click.Context` where this parser
                 should go with.
+    :param abbreviate_options: whether a long option can be given as any
+                               prefix of its name which isn't a prefix of
+                               another long option's name.
+    :param options_first: whether options have to come before any
+                          arguments, whatever the context says about
+                          interspersed arguments.  Parsing then stops
+                          looking for options at the first argument, so a
+                          trailer is split off as soon as the arguments
+                          before it have been taken, without the rest of
+                          the line ever being split into words.
     """
 
-    def __init__(self, ctx=None, opt_prefixes=('-', '--'), end_of_options='--'):
+    def __init__(self, ctx=None, opt_prefixes=('-', '--'), end_of_options='--',
+                 abbreviate_options=False, options_first=False):
         #: The :class:`~click.Context` for this parser.  This might be
         #: `None` for some advanced use cases.
         self.ctx = ctx
@@ -142,11 +261,28 @@ class OptionParser(object):
         if ctx is not None:
             self.allow_interspersed_args = ctx.allow_interspersed_args
             self.ignore_unknown_options = ctx.ignore_unknown_options
+        if options_first:
+            self.allow_interspersed_args = False
+        self._options_first = options_first
         self._short_opt = {}
-        self._long_opt = {}
+        self._options = OptionTrie()
+        self._abbreviate_options = abbreviate_options
         self._opt_prefixes = set(opt_prefixes)
         self._end_of_options = end_of_options
         self._args = []
+        self._layout = ArgumentLayout()
+
+    def bind(self, ctx):
+        """Returns a copy of this parser which shares its option and
+        argument tables but parses on behalf of `ctx`.  This is how a
+        parser compiled once gets reused for every invocation.
+        """
+        parser = copy.copy(self)
+        parser.ctx = ctx
+        parser.allow_interspersed_args = (
+            ctx.allow_interspersed_args and not self._options_first)
+        parser.ignore_unknown_options = ctx.ignore_unknown_options
+        return parser
 
     def add_option(self, opts, dest, obj, action=None, nargs=1, const=None):
         """Adds a new option named `dest` to the parser.  The destination
@@ -163,8 +299,9 @@ class OptionParser(object):
         self._opt_prefixes.update(option.prefixes)
         for opt in option._short_opts:
             self._short_opt[opt] = option
+            self._options.add(opt, option, is_long=False)
         for opt in option._long_opts:
-            self._long_opt[opt] = option
+            self._options.add(opt, option, is_long=True)
 
     def add_argument(self, dest, obj, nargs=1):
         """Adds a positional argument named `dest` to the parser.
@@ -172,6 +309,7 @@ class OptionParser(object):
         The `obj` can be used to identify the option in the order list
         that is returned from the parser.
         """
+        self._layout.add(nargs)
         self._args.append(Argument(dest=dest, nargs=nargs, obj=obj))
 
     def parse_args(self, args):
@@ -192,7 +330,7 @@ class OptionParser(object):
 
     def _process_args_for_args(self, state):
         state.shift_largs()
-        pargs, remainder = _unpack_args(state, self._args)
+        pargs, remainder = self._layout.unpack(state)
 
         for idx, arg in enumerate(self._args):
             arg.process(pargs[idx], state)
@@ -238,13 +376,7 @@ class OptionParser(object):
         # *empty* -- still a subset of [arg0, ..., arg(i-1)], but
         # not a very interesting subset!
 
-    def _match_long_opt(self, opt, explicit_value, state):
-        if opt not in self._long_opt:
-            possibilities = [word for word in self._long_opt
-                             if word.startswith(opt)]
-            raise NoSuchOption(opt, possibilities=possibilities)
-
-        option = self._long_opt[opt]
+    def _match_long_opt(self, opt, option, explicit_value, state):
         if option.takes_value:
             # At this point it's safe to modify rargs by injecting the
             # explicit value, because no exception is raised in this
@@ -284,7 +416,7 @@ class OptionParser(object):
                 # Any characters left in arg?  Pretend they're the
                 # next arg, and stop consuming characters of arg.
                 if i < len(arg):
-                    state.push_right(arg[i:])
+                    state.push_right(splut.tail(i))
                     stop = True
 
                 value = state.pop_nargs(option.nargs)
@@ -318,18 +450,23 @@ class OptionParser(object):
 
         # At this point we will match the (assumed) long option through
         # the long option matching code.  Note that this allows options
-        # like "-foo" to be matched as long options.
-        try:
-            self._match_long_opt(norm_long_opt, explicit_value, state)
-        except NoSuchOption:
-            # At this point the long option matching failed, and we need
-            # to try with short options.  However there is a special rule
-            # which says, that if we have a two character options prefix
-            # (applies to "--foo" for instance), we do not dispatch to the
-            # short option code and will instead raise the no option
-            # error.
-            if arg[:2] not in self._opt_prefixes:
-                return self._match_short_opt(splut, state)
-            if not self.ignore_unknown_options:
-                raise
-            state.push_left(splut)
+        # like "-foo" to be matched as long options.  Whether it's a long
+        # option at all is decided by looking it up, not by trying it.
+        option, possibilities = self._options.long_option(
+            norm_long_opt, self._abbreviate_options)
+        if option is not None:
+            if explicit_value is not None:
+                explicit_value = splut.tail(len(long_opt) + 1)
+            return self._match_long_opt(
+                norm_long_opt, option, explicit_value, state)
+
+        # At this point the long option matching failed, and we need to try
+        # with short options.  However there is a special rule which says,
+        # that if we have a two character options prefix (applies to "--foo"
+        # for instance), we do not dispatch to the short option code and
+        # will instead raise the no option error.
+        if arg[:2] not in self._opt_prefixes:
+            return self._match_short_opt(splut, state)
+        if not self.ignore_unknown_options:
+            raise NoSuchOption(norm_long_opt, possibilities=possibilities)
+        state.push_left(splut)
@@ -0,0 +1,118 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+from irclick._splut import Splut
+
+
+class Router(object):
+    """Dispatches lines to whichever of many line commands they're for.
+
+    Each command is added with a trigger, which is one or more words, such
+    as ``!foo``, ``.bar`` or ``nick: baz``.  The triggers are kept as a tree
+    of dicts keyed by word, so finding a line's command takes one dict
+    lookup per word of its trigger, however many commands there are.  The
+    command is then given the rest of the line as an offset into it, so
+    nothing is copied.
+
+    Every command keeps its own compiled parsers, so adding and removing
+    commands never touches any other command.
+
+    :param normalize: if given, called with each word of a trigger, both
+                      when it's added and when a line is routed, like
+                      click's ``token_normalize_func``.  ``str.lower``
+                      makes triggers case-insensitive, for example.
+    :param decoding: how to decode the trigger words of lines of bytes, as
+                     for :class:`~irclick._splut.ByteLine`.
+    """
+
+    def __init__(self, normalize=None, **decoding):
+        self.normalize = normalize
+        self.decoding = decoding
+        self._routes = {}
+
+    def _words(self, trigger):
+        words = trigger.split()
+        if not words:
+            raise ValueError('empty trigger %r' % (trigger,))
+        if self.normalize is not None:
+            words = [self.normalize(word) for word in words]
+        return words
+
+    def add(self, trigger, cmd):
+        """Routes lines starting with `trigger` to the line command `cmd`.
+
+        Raises :exc:`ValueError` if `trigger` is already routed, or if it
+        starts with, or is the start of, a trigger that is.
+        """
+        words = self._words(trigger)
+        node = self._routes
+        for word in words[:-1]:
+            node = node.setdefault(word, {})
+            if not isinstance(node, dict):
+                raise ValueError('%r is already routed' % (trigger,))
+        if words[-1] in node:
+            raise ValueError('%r is already routed' % (trigger,))
+        node[words[-1]] = cmd
+        return cmd
+
+    def remove(self, trigger):
+        """Stops routing `trigger`, raising :exc:`KeyError` if it isn't."""
+        words = self._words(trigger)
+        path = [self._routes]
+        for word in words[:-1]:
+            node = path[-1].get(word)
+            if not isinstance(node, dict):
+                raise KeyError(trigger)
+            path.append(node)
+        if isinstance(path[-1].get(words[-1], {}), dict):
+            raise KeyError(trigger)
+        del path[-1][words[-1]]
+        # Prune whatever's left empty, so dead words don't match anything.
+        for node, word in reversed(list(zip(path, words))):
+            if node.get(word) == {}:
+                del node[word]
+
+    def command(self, trigger):
+        """A decorator version of :meth:`add`."""
+        def decorator(cmd):
+            return self.add(trigger, cmd)
+        return decorator
+
+    def route(self, line, pos=0, endpos=None):
+        """Finds the command for the part of `line` from `pos` to `endpos`.
+
+        Returns the command and the offset in `line` just past the trigger,
+        or `None` if no trigger matches.
+        """
+        node = self._routes
+        normalize = self.normalize
+        for word in Splut.args_of_line(line, pos, endpos, **self.decoding):
+            key = word.string
+            if normalize is not None:
+                key = normalize(key)
+            node = node.get(key)
+            if node is None:
+                return None
+            if not isinstance(node, dict):
+                return node, word.end
+        return None
+
+    def invoke_line(self, line, pos=0, endpos=None, **kw):
+        """Invokes the command for `line` with the rest of `line`.
+
+        Returns the command's result, or `None` if there's no command for
+        `line`; use :meth:`route` to tell the two apart.
+        """
+        route = self.route(line, pos, endpos)
+        if route is None:
+            return None
+        cmd, pos = route
+        return cmd.invoke_line(line, pos=pos, endpos=endpos, **kw)
+
+    def parse_line(self, line, pos=0, endpos=None, **kw):
+        """Like :meth:`invoke_line`, but with ``parse_line``."""
+        route = self.route(line, pos, endpos)
+        if route is None:
+            return None
+        cmd, pos = route
+        return cmd.parse_line(line, pos=pos, endpos=endpos, **kw)
@@ -0,0 +1,113 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+import click
+import pytest
+
+from irclick import Message, Router, line_command, trailer_argument
+
+
+def make_command(name):
+    @line_command()
+    @click.command()
+    @click.option('-1', '--one')
+    @trailer_argument('trailer')
+    def cmd(one, trailer):
+        return name, one, trailer
+    return cmd
+
+
+@pytest.fixture
+def router():
+    router = Router()
+    for trigger in ['!foo', '.bar', 'nick: baz', 'nick: quux']:
+        router.add(trigger, make_command(trigger))
+    return router
+
+
+@pytest.mark.parametrize(('line', 'expected'), [
+    (u'!foo -1 hey hi  there', (u'!foo', u'hey', u'hi  there')),
+    (u'  .bar hi', (u'.bar', None, u'hi')),
+    (u'nick:   baz -1 x', (u'nick: baz', u'x', u'')),
+    (u'nick: quux', (u'nick: quux', None, u'')),
+    (b'!foo h\xc3\xa9llo', (u'!foo', None, u'h\xe9llo')),
+    (u'!FOO hi', None),
+    (u'nick: foo', None),
+    (u'nick:', None),
+    (u'hello there', None),
+    (u'', None),
+])
+def test_invoke_line(router, line, expected):
+    assert router.invoke_line(line) == expected
+
+
+def test_invoke_line_range(router):
+    message = Message.parse(u':n!u@h PRIVMSG #chan :!foo -1 a b  c\r\n')
+    assert router.invoke_line(
+        message.line, message.trailing_start, message.end) == (
+            u'!foo', u'a', u'b  c')
+
+
+def test_parse_line(router):
+    assert router.parse_line(u'.bar -1 x y').values == (
+        {'one': u'x', 'trailer': (u'y',)},)
+    assert router.parse_line(u'.baz') is None
+
+
+def test_route(router):
+    cmd, pos = router.route(u'  !foo bar')
+    assert cmd.invoke_line(u'bar') == (u'!foo', None, u'bar')
+    assert pos == 6
+
+
+def test_normalize():
+    router = Router(normalize=lambda word: word.lower())
+    cmd = router.command(u'!Foo')(make_command(u'!foo'))
+    assert router.route(u'!FOO')[0] is cmd
+    router.remove(u'!foo')
+    assert router.route(u'!FOO') is None
+
+
+def test_add_conflicts(router):
+    with pytest.raises(ValueError):
+        router.add(u'!foo', make_command(u'again'))
+    with pytest.raises(ValueError):
+        router.add(u'nick:', make_command(u'prefix'))
+    with pytest.raises(ValueError):
+        router.add(u'!foo bar', make_command(u'longer'))
+    with pytest.raises(ValueError):
+        router.add(u'  ', make_command(u'empty'))
+
+
+def test_remove(router):
+    router.remove(u'nick: baz')
+    assert router.invoke_line(u'nick: baz') is None
+    assert router.invoke_line(u'nick: quux')[0] == u'nick: quux'
+    router.remove(u'nick: quux')
+    router.add(u'nick:', make_command(u'nick:'))
+    assert router.invoke_line(u'nick: quux') == (u'nick:', None, u'quux')
+    for trigger in [u'nick: quux', u'!bar', u'nick: quux zot']:
+        with pytest.raises(KeyError):
+            router.remove(trigger)
+
+
+def test_adding_keeps_other_parsers(router):
+    compiled = []
+
+    class CountingOption(click.Option):
+        def add_to_parser(self, parser, ctx):
+            compiled.append(self.name)
+            return click.Option.add_to_parser(self, parser, ctx)
+
+    @router.command(u'!counted')
+    @line_command()
+    @click.command()
+    @click.option('-1', '--one', cls=CountingOption)
+    def cmd1(one):
+        return one
+
+    assert router.invoke_line(u'!counted -1 x') == u'x'
+    router.add(u'!new', make_command(u'!new'))
+    router.remove(u'.bar')
+    assert router.invoke_line(u'!counted -1 y') == u'y'
+    assert compiled == ['one']
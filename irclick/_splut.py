@@ -1,31 +1,212 @@
 # Copyright (c) Aaron Gallagher <_@habnab.it>
 # See LICENSE for details.
 
+import mmap
 import re
+import sys
+from collections import deque
+
+
+_WORD = re.compile(u'(?u)\\S+')
+_BYTE_WORD = re.compile(b'\\S+')
+_ASCII = re.compile(b'[\\x00-\\x7f]*\\Z')
+_BYTES_TYPES = bytes, bytearray, memoryview, mmap.mmap
+
+
+class LineView(object):
+    """The part of a line before `endpos`.  Slices of it are taken with
+    offsets into the whole line, but never extend past `endpos`, so a line
+    can be parsed in place inside a bigger buffer.
+    """
+
+    __slots__ = ('buffer', 'endpos')
+
+    def __init__(self, buffer, endpos=None):
+        self.buffer = buffer
+        if endpos is None:
+            endpos = len(buffer)
+        self.endpos = endpos
+
+    def __len__(self):
+        return self.endpos
+
+    def __getitem__(self, index):
+        stop = self.endpos
+        if index.stop is not None:
+            stop = min(index.stop, stop)
+        return self.buffer[index.start:stop]
+
+
+class ByteLine(LineView):
+    """A line of bytes which only decodes the parts of itself that are
+    sliced out of it.
+
+    Slices are decoded with `encoding` and `errors`.  If that fails and
+    there's a `fallback_encoding`, the slice is decoded with that instead,
+    which is how IRC clients conventionally deal with lines that aren't
+    UTF-8.  The default fallback of latin-1 can decode anything.
+    """
+
+    __slots__ = ('encoding', 'errors', 'fallback_encoding')
+
+    def __init__(self, buffer, endpos=None, encoding='utf-8', errors='strict',
+                 fallback_encoding='latin-1'):
+        LineView.__init__(self, buffer, endpos)
+        self.encoding = encoding
+        self.errors = errors
+        self.fallback_encoding = fallback_encoding
+
+    def __getitem__(self, index):
+        raw = LineView.__getitem__(self, index)
+        if isinstance(raw, memoryview):
+            raw = raw.tobytes()
+        try:
+            return raw.decode(self.encoding, self.errors)
+        except UnicodeDecodeError:
+            if self.fallback_encoding is None:
+                raise
+            return raw.decode(self.fallback_encoding, self.errors)
+
+    def is_ascii(self, start, end):
+        return _ASCII.match(self.buffer, start, end) is not None
+
+
+def is_bytes(line):
+    return isinstance(line, _BYTES_TYPES)
+
+
+def scannable(buffer):
+    """Returns `buffer`, or a copy of it which :mod:`re` can scan.  That's
+    only needed for a :class:`memoryview` on py2, whose :mod:`re` only
+    understands the old buffer interface.
+    """
+    if sys.version_info < (3,) and isinstance(buffer, memoryview):
+        return buffer.tobytes()
+    return buffer
 
 
 class Splut(object):
+    """A word of a line, stored as the offsets of the word in the line.
+
+    Neither the word nor the rest of the line starting at the word is
+    copied out of the line until it's asked for.  A Splut holds nothing
+    besides the two offsets and a reference to the line shared by every
+    word of it.
+    """
+
+    __slots__ = ('_line', 'start', 'end')
 
-    def __init__(self, string, match, line):
-        self.string = string
-        self._match = match
+    def __init__(self, line, start, end):
         self._line = line
+        self.start = start
+        self.end = end
+
+    @property
+    def line(self):
+        """The line this is a word of."""
+        return self._line
+
+    @property
+    def string(self):
+        return self._line[self.start:self.end]
+
+    def __str__(self):
+        return self.string
+
+    # So that click's make_str, which uses unicode() on py2, gets the word.
+    __unicode__ = __str__
 
     @property
     def trailer(self):
-        if self._match is None:
-            return self.string
+        return self._line[self.start:]
+
+    def tail(self, offset):
+        """Returns the part of this word starting at character `offset`,
+        without copying it.
+        """
+        line = self._line
+        if isinstance(line, ByteLine) and not line.is_ascii(
+                self.start, self.start + offset):
+            # The offset counts characters, which are only the same as bytes
+            # if they're all ASCII.
+            return Splut.ensure(self.string[offset:])
+        return type(self)(line, self.start + offset, self.end)
+
+    @classmethod
+    def args_of_line(cls, line, pos=0, endpos=None, **decoding):
+        """Splits `line` into words lazily.
+
+        Only the part of `line` from `pos` up to `endpos` is split, and
+        trailers stop at `endpos`, without copying that part out of `line`.
+
+        A `line` of bytes, including a :class:`bytearray`,
+        :class:`memoryview` or :class:`mmap.mmap`, is split on ASCII
+        whitespace without being decoded.  Each word, or trailer, is decoded
+        as it's used, according to the `decoding` arguments of
+        :class:`ByteLine`.  On py2, a :class:`memoryview` is copied first.
+        """
+        if endpos is None:
+            endpos = len(line)
+        if is_bytes(line):
+            buffer = line = scannable(line)
+            line = ByteLine(line, endpos, **decoding)
+            matches = _BYTE_WORD.finditer(buffer, pos, endpos)
         else:
-            return self._line[self._match.start():]
+            matches = _WORD.finditer(line, pos, endpos)
+            if endpos != len(line):
+                line = LineView(line, endpos)
+        return SplutStream(cls(line, m.start(), m.end()) for m in matches)
 
     @classmethod
-    def args_of_line(cls, line):
-        return [cls(m.group(0), m, line)
-                for m in re.finditer(u'(?u)\\S+', line)]
+    def ensure(cls, obj):
+        if isinstance(obj, cls):
+            return obj
+        else:
+            return cls(obj, 0, len(obj))
+
+
+class SplutStream(object):
+    """An iterator of :class:`Splut`\\s which are only produced as they're
+    pulled, but which can have words pushed back onto the front of it.
+
+    It's true if there are any words left, which requires splitting at most
+    one more word from the line.
+    """
+
+    def __init__(self, spluts=()):
+        self._pushed = deque()
+        self._spluts = iter(spluts)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._pushed:
+            return self._pushed.popleft()
+        return next(self._spluts)
+
+    next = __next__
+
+    def __bool__(self):
+        if not self._pushed:
+            splut = next(self._spluts, None)
+            if splut is None:
+                return False
+            self._pushed.append(splut)
+        return True
+
+    __nonzero__ = __bool__
+
+    def push(self, *spluts):
+        self._pushed.extendleft(reversed(spluts))
+
+    def clear(self):
+        self._pushed.clear()
+        self._spluts = iter(())
 
     @classmethod
     def ensure(cls, obj):
         if isinstance(obj, cls):
             return obj
         else:
-            return cls(obj, None, None)
+            return cls(Splut.ensure(x) for x in obj)
@@ -0,0 +1,174 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+import mmap
+import os
+
+from irclick._irclick import LINE_ERRORS, LineResult
+
+
+#: The longest line IRC allows, with CR LF: 8191 bytes of IRCv3 message
+#: tags on top of the 512 bytes of the message itself.
+MAX_LINE = 8191 + 512
+
+
+class LineBuffer(object):
+    """A fixed-size buffer which incoming data is read straight into, and
+    which is split into lines in place.
+
+    Data is read into :meth:`free` and then :meth:`commit`\\ed; afterwards,
+    :meth:`lines` gives the offsets of each complete line in `buffer`.
+    Lines end with CR LF or just LF, neither of which is included, and empty
+    lines are skipped.  Nothing is copied except for the start of a line
+    which was cut off by the end of the buffer, which is moved back to the
+    front when there's no room left after it.
+
+    Since the buffer is reused, a line is only valid until the next call to
+    :meth:`free`; anything that needs to keep it longer has to copy it.
+    Lines longer than `size` can't fit, so they're thrown away, up to the
+    next line ending, and counted in `discarded`.
+    """
+
+    def __init__(self, size=MAX_LINE):
+        self.buffer = bytearray(size)
+        self._view = memoryview(self.buffer)
+        #: The start of the first line which hasn't been handed out.
+        self._start = 0
+        #: Where to continue looking for the end of that line.
+        self._scanned = 0
+        #: The end of the data read so far.
+        self._end = 0
+        #: Whether the data up to the next line ending is the rest of a line
+        #: which was too long.
+        self._discarding = False
+        #: How many lines have been thrown away for being too long.
+        self.discarded = 0
+
+    def free(self):
+        """Returns a writable :class:`memoryview` of the free space at the
+        end of the buffer, making room first if needed.
+        """
+        if self._start == self._end:
+            self._start = self._scanned = self._end = 0
+        elif self._end == len(self.buffer):
+            if self._start == 0:
+                # A whole buffer without a line ending can't be kept.
+                if not self._discarding:
+                    self._discarding = True
+                    self.discarded += 1
+                self._scanned = self._end = 0
+                return self._view
+            # The slice assignment can't resize the buffer, so it's fine
+            # while the view of it is alive.
+            n = self._end - self._start
+            self.buffer[:n] = self.buffer[self._start:self._end]
+            self._scanned -= self._start
+            self._start, self._end = 0, n
+        return self._view[self._end:]
+
+    def commit(self, n):
+        """Records that `n` bytes were written to the start of :meth:`free`.
+        """
+        self._end += n
+
+    def lines(self, eof=False):
+        """Yields the ``(pos, endpos)`` of each complete line read so far.
+
+        A line counts as consumed as soon as it's yielded.  With `eof`, any
+        data left after the last line ending is yielded as a line too.
+        """
+        buffer = self.buffer
+        while True:
+            i = buffer.find(b'\n', self._scanned, self._end)
+            if i < 0:
+                self._scanned = self._end
+                if not eof or self._start == self._end:
+                    return
+                i = self._end
+            start = self._start
+            self._start = self._scanned = min(i + 1, self._end)
+            if self._discarding:
+                self._discarding = False
+                continue
+            if i > start and buffer[i - 1] == 0x0d:
+                i -= 1
+            if i > start:
+                yield start, i
+
+
+def read_socket(sock, dispatch, size=MAX_LINE):
+    """Reads lines from `sock` until it's closed, calling
+    ``dispatch(buffer, pos, endpos)`` with each of them.
+
+    The lines are read into a :class:`LineBuffer` of `size` bytes, and
+    `dispatch` gets the offsets of each line in that buffer, so a line
+    command's ``invoke_line`` or :meth:`Message.parse` can be passed as
+    `dispatch` directly.  Nothing more is read from `sock` until `dispatch`
+    returns, so a slow dispatcher leaves the rest of a flood in the socket's
+    buffers, where TCP flow control deals with it.
+
+    Lines too long to fit are skipped.  Exceptions from `dispatch` stop
+    reading and are propagated.
+    """
+    lines = LineBuffer(size)
+    while True:
+        n = sock.recv_into(lines.free())
+        lines.commit(n)
+        for pos, endpos in lines.lines(eof=not n):
+            dispatch(lines.buffer, pos, endpos)
+        if not n:
+            return
+
+
+def replay_file(path, dispatch):
+    """Memory-maps the file at `path` and calls ``dispatch(mapping, pos,
+    endpos)`` with each of its lines, like :func:`read_socket` does.
+
+    Nothing is read up front; the lines are found in the mapping as it's
+    walked, and only what `dispatch` slices out of it is ever copied or
+    decoded, so a command given the lines with its ``invoke_line`` only
+    decodes the words it uses.  The mapping is closed once every line has
+    been dispatched, so `dispatch` mustn't hold on to it.  The exception of
+    a line which failed partway through can still refer to the mapping,
+    though, in which case the mapping is left to be closed when that
+    exception is freed.
+
+    Yields a :class:`LineResult` for each line, with the line's number in
+    the file, counting from zero, as its `line`.  As with ``invoke_lines``,
+    a line which raises an exception, or exits after ``--help``, has that
+    as its `error`.  Empty lines are
+    skipped, but still counted.
+    """
+    with open(path, 'rb') as infile:
+        if os.fstat(infile.fileno()).st_size == 0:
+            return
+        mapping = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mapping.madvise(mmap.MADV_SEQUENTIAL)
+        end = len(mapping)
+        pos = 0
+        number = 0
+        while pos < end:
+            i = mapping.find(b'\n', pos)
+            next_pos = end if i < 0 else i + 1
+            if i < 0:
+                i = end
+            if i > pos and mapping[i - 1:i] == b'\r':
+                i -= 1
+            if i > pos:
+                try:
+                    result = dispatch(mapping, pos, i)
+                except LINE_ERRORS as e:
+                    yield LineResult(number, None, e)
+                else:
+                    yield LineResult(number, result, None)
+            pos = next_pos
+            number += 1
+    finally:
+        try:
+            mapping.close()
+        except BufferError:
+            # Something, usually the traceback of an error yielded above,
+            # still has a view of the mapping.
+            pass
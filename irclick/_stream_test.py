@@ -0,0 +1,147 @@
+# Copyright (c) Aaron Gallagher <_@habnab.it>
+# See LICENSE for details.
+
+import contextlib
+import socket
+import threading
+
+import click
+import pytest
+
+from irclick import (
+    LineBuffer, Message, Router, line_command, read_socket, replay_file,
+    trailer_argument)
+
+
+def feed(lines, data, eof=False):
+    free = lines.free()
+    free[:len(data)] = data
+    lines.commit(len(data))
+    return [bytes(lines.buffer[pos:endpos])
+            for pos, endpos in lines.lines(eof=eof)]
+
+
+def test_line_buffer_splits_in_place():
+    lines = LineBuffer(64)
+    assert feed(lines, b'PING :a\r\nPING :b\nPI') == [b'PING :a', b'PING :b']
+    assert feed(lines, b'NG :c\r') == []
+    assert feed(lines, b'\n\r\n\nPING :d') == [b'PING :c']
+    assert feed(lines, b'', eof=True) == [b'PING :d']
+
+
+def test_line_buffer_reuses_space():
+    lines = LineBuffer(16)
+    buffer = lines.buffer
+    for i in range(100):
+        assert feed(lines, b'line %d\r\n' % (i,)) == [b'line %d' % (i,)]
+    assert feed(lines, b'0123456789') == []
+    assert feed(lines, b'abc\r\n') == [b'0123456789abc']
+    assert lines.buffer is buffer
+    assert len(buffer) == 16
+
+
+def test_line_buffer_line_too_long():
+    lines = LineBuffer(8)
+    assert feed(lines, b'ok\r\n0123') == [b'ok']
+    assert feed(lines, b'4567') == []
+    assert feed(lines, b'89abcdef') == []
+    assert feed(lines, b'gh\nnext') == []
+    assert feed(lines, b'\n') == [b'next']
+    assert feed(lines, b'last', eof=True) == [b'last']
+    assert lines.discarded == 1
+
+
+def test_line_buffer_fits_longest_line():
+    lines = LineBuffer()
+    line = b'@' + b't' * 8189 + b' :n!u@h PRIVMSG #c :' + b'x' * 491
+    assert len(line) + 2 == 8191 + 512
+    assert feed(lines, line + b'\r\n') == [line]
+    assert lines.discarded == 0
+
+
+def test_read_socket():
+    @line_command()
+    @click.command()
+    @click.option('-1', '--one')
+    @trailer_argument('trailer')
+    def cmd1(one, trailer):
+        results.append((one, trailer))
+
+    results = []
+    messages = []
+
+    def dispatch(buffer, pos, endpos):
+        message = Message.parse(buffer, pos, endpos)
+        messages.append(message.command)
+        message.invoke_line(cmd1)
+
+    a, b = socket.socketpair()
+    data = b''.join(
+        b':n!u@h PRIVMSG #c :-1 %d hi  there\r\n' % (i,) for i in range(500))
+
+    def send():
+        with contextlib.closing(a):
+            a.sendall(data + b'PING :x')
+
+    sender = threading.Thread(target=send)
+    sender.start()
+    with contextlib.closing(b):
+        read_socket(b, dispatch, size=100)
+    sender.join()
+    assert messages == ['PRIVMSG'] * 500 + ['PING']
+    assert results == [(u'%d' % (i,), u'hi  there') for i in range(500)] + [
+        (None, u'x')]
+
+
+@pytest.mark.parametrize(('data', 'expected'), [
+    (b'', []),
+    (b'\n\r\n', []),
+    (b'!count -n 2 a b\r\n\n!echo h\xc3\xa9llo  there\n!count -n x y\n'
+     b'!nothing\n!echo --help\n!echo last', [
+         (0, (u'a', u'b'), None),
+         (2, u'h\xe9llo  there', None),
+         (3, None, click.BadParameter),
+         (4, None, None),
+         (5, None, SystemExit),
+         (6, u'last', None)]),
+])
+def test_replay_file(tmpdir, data, expected):
+    router = Router()
+
+    @router.command(u'!count')
+    @line_command()
+    @click.command()
+    @click.option('-n', type=int)
+    @click.argument('words', nargs=-1)
+    def count(n, words):
+        return words[:n]
+
+    @router.command(u'!echo')
+    @line_command()
+    @click.command()
+    @trailer_argument('trailer')
+    def echo(trailer):
+        return trailer
+
+    path = tmpdir.join('log')
+    path.write_binary(data)
+    results = [
+        (r.line, r.result, r.error and type(r.error))
+        for r in replay_file(str(path), router.invoke_line)]
+    assert results == expected
+
+
+def test_replay_file_keeps_errors(tmpdir):
+    @line_command()
+    @click.command()
+    @click.option('-1', '--one')
+    @click.argument('words', nargs=-1)
+    def cmd(one, words):
+        return words
+
+    path = tmpdir.join('log')
+    path.write_binary(b'-1 a b c\n--bogus x y z\n')
+    results = list(replay_file(str(path), cmd.invoke_line))
+    assert [(r.line, r.result) for r in results] == [
+        (0, (u'b', u'c')), (1, None)]
+    assert isinstance(results[1].error, click.NoSuchOption)
@@ -12,6 +12,7 @@ setup(
     version=versioneer.get_version(),
     cmdclass=versioneer.get_cmdclass(),
 
-    install_requires=['click', 'contextlib2'],
+    install_requires=['click', 'futures; python_version < "3.2"'],
+    extras_require={'numpy': ['numpy']},
     packages=['irclick'],
 )